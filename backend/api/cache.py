@@ -0,0 +1,176 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.exceptions import EmptyResultSet
+from django.db import connection
+from django.utils.connection import ConnectionProxy
+
+# Счётчики поколений лежат отдельно от ответов и фрагментов, чтобы
+# их не вытесняли записи, которых гораздо больше.
+generations_cache = ConnectionProxy(caches, 'generations')
+
+CATALOG = 'catalog'
+COUNTS = 'counts'
+# Счётчики избранного, покупок, рецептов и подписчиков.
+COUNTERS = 'counters'
+RECIPES = 'recipes'
+STATS = ('hits', 'misses')
+
+
+def get_generation(name):
+    """Текущее поколение именованного набора закэшированных данных.
+
+    Новый счётчик начинается со значения времени, чтобы после вытеснения
+    или истечения GENERATIONS_TIMEOUT не совпасть с одним из прежних
+    поколений.
+    """
+    key = f'generation:{name}'
+    generation = generations_cache.get(key)
+    if generation is None:
+        generations_cache.add(
+            key, time.time_ns(), settings.GENERATIONS_TIMEOUT)
+        generation = generations_cache.get(key)
+    return generation
+
+
+def get_generations(names):
+    """Поколения сразу нескольких наборов одним обращением к кэшу."""
+    keys = {f'generation:{name}': name for name in names}
+    generations = generations_cache.get_many(keys)
+    missing = keys.keys() - generations.keys()
+    if missing:
+        for key in missing:
+            generations_cache.add(
+                key, time.time_ns(), settings.GENERATIONS_TIMEOUT)
+        generations.update(generations_cache.get_many(missing))
+    return {keys[key]: generation for key, generation in generations.items()}
+
+
+def recipe_generation(pk):
+    return f'recipe:{pk}'
+
+
+def user_generation(pk):
+    return f'user:{pk}'
+
+
+def user_state_generation(pk):
+    """Избранное, список покупок и подписки пользователя."""
+    return f'user_state:{pk}'
+
+
+def bump_generation(*names):
+    """Делает устаревшими все данные, закэшированные под этими именами."""
+    for name in names:
+        key = f'generation:{name}'
+        try:
+            generations_cache.incr(key)
+        except ValueError:
+            generations_cache.set(
+                key, time.time_ns(), settings.GENERATIONS_TIMEOUT)
+
+
+def make_digest(*parts):
+    return hashlib.md5(
+        '|'.join(str(part) for part in parts).encode()).hexdigest()
+
+
+def make_key(prefix, *parts):
+    return f'{prefix}:{make_digest(*parts)}'
+
+
+def get_estimated_count(model):
+    """Оценка числа строк таблицы по статистике PostgreSQL."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+            (model._meta.db_table,),
+        )
+        row = cursor.fetchone()
+    return row[0] if row else -1
+
+
+def get_cached_count(queryset):
+    """COUNT(*) для queryset с кэшированием по тексту запроса.
+
+    Ключ строится из SQL с параметрами, так что разные фильтры и разные
+    пользователи получают разные записи. Для больших таблиц без
+    фильтров на PostgreSQL возвращается приблизительная оценка.
+    """
+    threshold = settings.APPROXIMATE_COUNT_THRESHOLD
+    if (
+        threshold and connection.vendor == 'postgresql'
+        and not queryset.query.where
+    ):
+        estimate = get_estimated_count(queryset.model)
+        if estimate >= threshold:
+            return estimate
+    try:
+        sql, params = queryset.query.sql_with_params()
+    except EmptyResultSet:
+        return 0
+    key = make_key('count', get_generation(COUNTS), sql, params)
+    count = cache.get(key)
+    if count is None:
+        count = queryset.count()
+        cache.set(key, count, settings.COUNT_CACHE_TIMEOUT)
+    return count
+
+
+def incr_stat(name, stat):
+    key = f'stats:{name}:{stat}'
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
+
+
+def get_stats(*names):
+    """Счётчики попаданий и промахов кэша для мониторинга."""
+    keys = {
+        f'stats:{name}:{stat}': (name, stat)
+        for name in names for stat in STATS
+    }
+    values = cache.get_many(keys)
+    stats = {name: dict.fromkeys(STATS, 0) for name in names}
+    for key, (name, stat) in keys.items():
+        stats[name][stat] = values.get(key, 0)
+    return stats
+
+
+def get_response_cache_key(request, name, extra_names=()):
+    """Ключ ответа: поколения, адрес и отсортированные параметры запроса."""
+    query = sorted(
+        (param, sorted(values))
+        for param, values in request.query_params.lists()
+    )
+    return make_key(
+        f'response:{name}', get_generation(name),
+        *(get_generation(extra_name) for extra_name in extra_names),
+        request.build_absolute_uri(request.path), query,
+    )
+
+
+def get_recipe_fragment_keys(recipes, base_url):
+    """Ключи кэша общей части представления рецептов.
+
+    Ключ меняется при изменении самого рецепта, профиля автора
+    и справочников тегов и ингредиентов.
+    """
+    names = {CATALOG}
+    for recipe in recipes:
+        names.add(recipe_generation(recipe.pk))
+        names.add(user_generation(recipe.author_id))
+    generations = get_generations(names)
+    return {
+        recipe.pk: make_key(
+            'fragment', recipe.pk,
+            generations[recipe_generation(recipe.pk)],
+            generations[user_generation(recipe.author_id)],
+            generations[CATALOG], base_url,
+        )
+        for recipe in recipes
+    }
@@ -0,0 +1,108 @@
+import gzip
+import os
+import threading
+from collections import namedtuple
+
+from django.conf import settings
+from django.utils.http import quote_etag
+from rest_framework.renderers import JSONRenderer
+
+from api.cache import CATALOG, bump_generation, get_generation, make_digest
+from api.serializers import IngredientsSerializer, TagsSerializer
+from recipes.models import Ingredient, Tag
+
+Snapshot = namedtuple(
+    'Snapshot', ('generation', 'content', 'compressed', 'etag'))
+
+
+class CatalogSnapshot:
+    """Готовый JSON справочника в памяти процесса.
+
+    Собирается один раз на поколение CATALOG: ответ уже сериализован
+    и сжат, поэтому запрос без параметров не обращается к базе.
+    """
+
+    def __init__(self, name, model, serializer_class):
+        self.name = name
+        self.model = model
+        self.serializer_class = serializer_class
+        self._lock = threading.Lock()
+        self._snapshot = None
+
+    def build(self, generation=None):
+        data = self.serializer_class(
+            self.model.objects.all(), many=True).data
+        content = JSONRenderer().render(data)
+        return Snapshot(
+            generation,
+            content,
+            gzip.compress(content, mtime=0),
+            quote_etag(make_digest(content.decode())),
+        )
+
+    def get(self):
+        generation = get_generation(CATALOG)
+        snapshot = self._snapshot
+        if snapshot is None or snapshot.generation != generation:
+            with self._lock:
+                snapshot = self._snapshot
+                if snapshot is None or snapshot.generation != generation:
+                    snapshot = self._snapshot = self.build(generation)
+        return snapshot
+
+    def write(self, directory):
+        """Записывает {name}.json и {name}.json.gz для gzip_static nginx."""
+        snapshot = self.build()
+        for filename, content in (
+            (f'{self.name}.json', snapshot.content),
+            (f'{self.name}.json.gz', snapshot.compressed),
+        ):
+            path = os.path.join(directory, filename)
+            with open(f'{path}.tmp', 'wb') as file:
+                file.write(content)
+            os.replace(f'{path}.tmp', path)
+
+
+tags_snapshot = CatalogSnapshot('tags', Tag, TagsSerializer)
+ingredients_snapshot = CatalogSnapshot(
+    'ingredients', Ingredient, IngredientsSerializer)
+
+
+class TagSlugMap:
+    """Словарь слаг → id тегов в памяти процесса.
+
+    Перестраивается, когда меняется поколение CATALOG, так что фильтр
+    по тегам не обращается за ним к базе.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._generation = None
+        self._ids = None
+
+    def _get_ids(self):
+        generation = get_generation(CATALOG)
+        if self._generation != generation:
+            with self._lock:
+                if self._generation != generation:
+                    self._ids = dict(Tag.objects.values_list('slug', 'id'))
+                    self._generation = generation
+        return self._ids
+
+    def get_ids(self, slugs):
+        """Id тегов по слагам; неизвестные слаги пропускаются."""
+        ids = self._get_ids()
+        return [ids[slug] for slug in slugs if slug in ids]
+
+
+tag_slug_map = TagSlugMap()
+
+
+def rebuild_catalog():
+    """Сбрасывает снимки во всех процессах и перезаписывает файлы."""
+    bump_generation(CATALOG)
+    directory = settings.CATALOG_SNAPSHOT_DIR
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        for snapshot in (tags_snapshot, ingredients_snapshot):
+            snapshot.write(directory)
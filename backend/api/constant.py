@@ -31,4 +31,15 @@ ROLE_USER = [
     (ADMIN, 'Администратор')
 ]
 PAGINATOR_PAGE_SIZE = 6
-MAX_PAGE_SIZE = 10
+MAX_PAGE_SIZE = 100
+INGREDIENTS_SEARCH_LIMIT = 50
+IMAGE_THUMBNAIL_SIZE = 320
+IMAGE_LARGE_SIZE = 1280
+IMAGE_QUALITY = 80
+# Кратно 4, чтобы каждая часть base64 декодировалась отдельно.
+BASE64_CHUNK_SIZE = 64 * 1024
+BASE64_WHITESPACE = ' \t\r\n'
+MAX_BULK_RECIPES = 500
+SHORT_LINK_CACHE_SIZE = 4096
+SEARCH_BATCH_SIZE = 500
+MAX_COOKING_INGREDIENTS = 50
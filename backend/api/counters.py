@@ -0,0 +1,30 @@
+class CountersMixin:
+    """Не перезаписывает счётчики при обычном сохранении.
+
+    Счётчики (counter_fields) меняются только выражениями F(), а объект
+    в памяти может хранить устаревшие значения. Поэтому save() уже
+    сохранённого объекта без update_fields превращается
+    в save(update_fields=все поля, кроме счётчиков).
+
+    Отличие от обычного save(): это всегда UPDATE. Если строки в базе
+    уже нет, Django не вставит её заново, а поднимет DatabaseError
+    («Save with update_fields did not affect any rows»). Явные
+    update_fields и force_insert, а также новые объекты сохраняются
+    как обычно. Чтобы записать счётчик, используйте
+    recipes.services.change_counter или update() с явным значением.
+    """
+
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if (
+            not args and not self._state.adding
+            and not kwargs.get('force_insert')
+            and kwargs.get('update_fields') is None
+        ):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.counter_fields
+            ]
+        super().save(*args, **kwargs)
@@ -1,17 +1,169 @@
 import base64
+import binascii
+from tempfile import SpooledTemporaryFile
 
-from django.core.files.base import ContentFile
+from django.conf import settings
+from django.core.files.base import File
+from PIL import Image
 from rest_framework import serializers
+from rest_framework.relations import MANY_RELATION_KWARGS
+
+from api.constant import BASE64_CHUNK_SIZE, BASE64_WHITESPACE
+from api.images import get_rendition
+from api.utils import get_ids
+
+
+def decode_base64(data, start):
+    """Декодирует data[start:] частями во временный файл.
+
+    Пробелы и переводы строк (base64 с переносами по 76 символов)
+    отбрасываются, а остаток части, не кратный 4, переносится
+    в следующую. Пока файл меньше FILE_UPLOAD_MAX_MEMORY_SIZE,
+    он держится в памяти, дальше уходит на диск.
+    """
+    file = SpooledTemporaryFile(
+        max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+    tail = ''
+    try:
+        for position in range(start, len(data), BASE64_CHUNK_SIZE):
+            chunk = tail + ''.join(
+                data[position:position + BASE64_CHUNK_SIZE].split())
+            size = len(chunk) // 4 * 4
+            file.write(base64.b64decode(chunk[:size], validate=True))
+            tail = chunk[size:]
+        if tail:
+            raise binascii.Error('Incorrect padding')
+    except binascii.Error:
+        file.close()
+        raise
+    file.seek(0)
+    return file
+
+
+def get_decoded_size(data, start):
+    """Оценка размера data[start:] после декодирования, без копий строки.
+
+    Пробелы и переводы строк не считаются. Оценка может быть больше
+    настоящего размера на пару байт паддинга, но не меньше.
+    """
+    length = len(data) - start - sum(
+        data.count(char, start) for char in BASE64_WHITESPACE)
+    return length // 4 * 3
 
 
 class Base64ImageField(serializers.ImageField):
-    """Сериализатор для аватарок."""
+    """Сериализатор для аватарок.
+
+    rendition — поле модели с уменьшенной копией, которая отдаётся
+    вместо оригинала, когда уже построена.
+    """
+
+    default_error_messages = {
+        'too_large': 'Размер картинки не должен превышать {max_size} байт.',
+        'invalid_base64': 'Картинка должна быть в формате data:image base64.',
+    }
+
+    def __init__(self, *args, rendition=None, **kwargs):
+        self.rendition = rendition
+        super().__init__(*args, **kwargs)
+
+    def get_attribute(self, instance):
+        if self.rendition:
+            rendition = get_rendition(instance, self.rendition)
+            if rendition:
+                return rendition
+        return super().get_attribute(instance)
 
     def to_internal_value(self, data):
-        if isinstance(data, str) and data.startswith('data:image'):
-            format, imgstr = data.split(';base64,')
-            ext = format.split('/')[-1]
+        """Картинка из data URI без копий всей строки в памяти.
+
+        Размер проверяется до декодирования, а картинка — только
+        по заголовку, без разбора всех пикселей.
+        """
+        if not (isinstance(data, str) and data.startswith('data:image')):
+            return super().to_internal_value(data)
+        start = data.find(';base64,')
+        if start == -1:
+            self.fail('invalid_base64')
+        ext = data[:start].split('/')[-1]
+        start += len(';base64,')
+        if get_decoded_size(data, start) > settings.MAX_IMAGE_SIZE:
+            self.fail('too_large', max_size=settings.MAX_IMAGE_SIZE)
+        try:
+            file = decode_base64(data, start)
+        except binascii.Error:
+            self.fail('invalid_base64')
+        try:
+            Image.open(file)
+        except Exception:
+            file.close()
+            self.fail('invalid_image')
+        file.seek(0)
+        return serializers.FileField.to_internal_value(
+            self, File(file, name=f'temp.{ext}'))
+
 
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
+def load_related(context, context_key, queryset, values):
+    """Id из values, которых нет в базе.
 
+    Объекты берутся из context[context_key], а если словаря там нет,
+    загружаются одним запросом IN и кладутся в контекст для остальных
+    полей запроса.
+    """
+    ids = get_ids(values)
+    objects = context.get(context_key)
+    if objects is None:
+        objects = context[context_key] = queryset.in_bulk(ids)
+    return sorted(pk for pk in ids if pk not in objects)
+
+
+class BatchManyRelatedField(serializers.ManyRelatedField):
+    """Список первичных ключей, проверяемый одним запросом."""
+
+    default_error_messages = {
+        'does_not_exist_many': 'Не найдены объекты с id: {pk_values}.',
+    }
+
+    def to_internal_value(self, data):
+        if isinstance(data, list):
+            child = self.child_relation
+            missing = load_related(
+                self.context, child.context_key, child.get_queryset(), data)
+            if missing:
+                self.fail('does_not_exist_many', pk_values=', '.join(
+                    str(pk) for pk in missing))
         return super().to_internal_value(data)
+
+
+class BatchPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """Первичный ключ, который ищется в словаре из контекста.
+
+    Словарь context[context_key] загружается один раз на всю пачку
+    рецептов или на все значения запроса; без него поле работает
+    как обычное.
+    """
+
+    def __init__(self, context_key=None, **kwargs):
+        self.context_key = context_key
+        super().__init__(**kwargs)
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {'child_relation': cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return BatchManyRelatedField(**list_kwargs)
+
+    def to_internal_value(self, data):
+        objects = self.context.get(self.context_key)
+        if objects is None:
+            return super().to_internal_value(data)
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            return objects[int(data)]
+        except KeyError:
+            self.fail('does_not_exist', pk_value=data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
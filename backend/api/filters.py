@@ -1,6 +1,10 @@
+from django.db.models import Exists, OuterRef
 from django_filters import rest_framework as filters
+from django_filters.widgets import QueryArrayWidget
 
-from recipes.models import Ingredient, Recipe
+from api.catalog import tag_slug_map
+from api.search import search_recipes
+from recipes.models import Ingredient, Recipe, TagsRecipe
 
 
 class IngredientSearchFilter(filters.FilterSet):
@@ -11,11 +15,65 @@ class IngredientSearchFilter(filters.FilterSet):
         fields = ('name',)
 
 
+# Сортировки по счётчикам: они меняются без записи самого рецепта.
+COUNTER_ORDERINGS = (
+    'favorites_count',
+    'in_carts_count',
+    'author_recipes_count',
+    'author_followers_count',
+)
+
+
+class StableOrderingFilter(filters.OrderingFilter):
+    """Сортировка с id в конце, чтобы равные значения не перемешивали
+    страницы."""
+
+    def filter(self, qs, value):
+        qs = super().filter(qs, value)
+        if value:
+            qs = qs.order_by(*qs.query.order_by, '-id')
+        return qs
+
+
+class TagsFilter(filters.Filter):
+    """Рецепты хотя бы с одним из тегов, по слагам (повтором параметра
+    или через запятую).
+
+    Слаги переводятся в id по словарю в памяти, а рецепты отбираются
+    подзапросом EXISTS по TagsRecipe: строки не размножаются JOIN,
+    и DISTINCT не нужен. Неизвестные слаги пропускаются.
+    """
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('widget', QueryArrayWidget)
+        super().__init__(*args, **kwargs)
+
+    def filter(self, qs, value):
+        if not value:
+            return qs
+        tag_ids = tag_slug_map.get_ids(
+            slug for values in value for slug in values.split(',') if slug)
+        if not tag_ids:
+            return qs.none()
+        return qs.filter(Exists(TagsRecipe.objects.filter(
+            recipe=OuterRef('pk'), name_id__in=tag_ids)))
+
+
 class RecipeFilter(filters.FilterSet):
-    tags = filters.AllValuesMultipleFilter(field_name='tags__slug')
+    tags = TagsFilter()
     is_favorited = filters.BooleanFilter(method='filter_is_favorited')
     is_in_shopping_cart = filters.BooleanFilter(
         method='filter_is_in_shopping_cart')
+    search = filters.CharFilter(method='filter_search')
+    ordering = StableOrderingFilter(
+        fields=(
+            ('pub_date', 'pub_date'),
+            ('favorites_count', 'favorites_count'),
+            ('in_carts_count', 'in_carts_count'),
+            ('author__recipes_count', 'author_recipes_count'),
+            ('author__followers_count', 'author_followers_count'),
+        ),
+    )
 
     class Meta:
         model = Recipe
@@ -33,3 +91,12 @@ class RecipeFilter(filters.FilterSet):
         if self.is_user_authenticated() and value:
             return queryset.filter(shopping_lists__author=self.request.user)
         return queryset
+
+    def filter_search(self, queryset, name, value):
+        """Полнотекстовый поиск; без ordering сначала самые подходящие."""
+        if not value.strip():
+            return queryset
+        queryset = search_recipes(queryset, value)
+        if 'ordering' in self.data:
+            return queryset
+        return queryset.order_by('-search_rank', '-pub_date', '-id')
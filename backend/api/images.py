@@ -0,0 +1,160 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from PIL import Image, ImageOps, features
+
+from api.cache import (RECIPES, bump_generation, recipe_generation,
+                       user_generation)
+from api.constant import IMAGE_LARGE_SIZE, IMAGE_QUALITY, IMAGE_THUMBNAIL_SIZE
+from recipes.models import Recipe
+from user.models import User
+
+logger = logging.getLogger(__name__)
+
+if features.check('webp'):
+    RENDITION_FORMAT, RENDITION_EXTENSION = 'WEBP', 'webp'
+else:
+    RENDITION_FORMAT, RENDITION_EXTENSION = 'JPEG', 'jpg'
+
+# Модель: (поколение кэша объекта,
+#          ((исходное поле, поле копии, имя размера, размер), ...)).
+RENDITIONS = {
+    Recipe: (recipe_generation, (
+        ('image', 'image_thumbnail', 'thumbnail', IMAGE_THUMBNAIL_SIZE),
+        ('image', 'image_large', 'large', IMAGE_LARGE_SIZE),
+    )),
+    User: (user_generation, (
+        ('avatar', 'avatar_thumbnail', 'thumbnail', IMAGE_THUMBNAIL_SIZE),
+    )),
+}
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.IMAGE_WORKERS,
+            thread_name_prefix='renditions',
+        )
+    return _executor
+
+
+def get_rendition_name(instance, source_field, rendition_field, size_name):
+    """Имя копии однозначно выводится из имени исходного файла."""
+    source = getattr(instance, source_field)
+    stem = os.path.splitext(os.path.basename(source.name))[0]
+    upload_to = instance._meta.get_field(rendition_field).upload_to
+    return f'{upload_to}{stem}_{size_name}.{RENDITION_EXTENSION}'
+
+
+def get_stale_renditions(instance):
+    """Поля копий, которые не соответствуют текущему исходному файлу."""
+    _, renditions = RENDITIONS[instance._meta.concrete_model]
+    stale = []
+    for source_field, rendition_field, size_name, _ in renditions:
+        rendition = getattr(instance, rendition_field)
+        if not getattr(instance, source_field):
+            if rendition:
+                stale.append(rendition_field)
+        elif rendition.name != get_rendition_name(
+            instance, source_field, rendition_field, size_name
+        ):
+            stale.append(rendition_field)
+    return stale
+
+
+def has_pending_renditions(recipe):
+    """Копии картинки рецепта или аватара автора поставлены в очередь
+    в этом запросе, и объект в памяти ещё не знает их имён."""
+    return (
+        getattr(recipe, '_pending_renditions', False)
+        or getattr(recipe.author, '_pending_renditions', False)
+    )
+
+
+def get_rendition(instance, rendition_field):
+    """Готовая копия картинки или None, пока её не построили."""
+    rendition = getattr(instance, rendition_field, None)
+    if not rendition or rendition_field in get_stale_renditions(instance):
+        return None
+    return rendition
+
+
+def make_rendition(source, size):
+    with source.open('rb') as file:
+        image = ImageOps.exif_transpose(Image.open(file))
+        image.thumbnail((size, size))
+    if image.mode not in ('RGB', 'RGBA') or RENDITION_FORMAT == 'JPEG':
+        image = image.convert('RGB')
+    buffer = BytesIO()
+    image.save(buffer, RENDITION_FORMAT, quality=IMAGE_QUALITY)
+    return ContentFile(buffer.getvalue())
+
+
+def process_renditions(model, pk, force=False):
+    """Строит недостающие копии картинок объекта и сохраняет их имена.
+
+    Имена записываются через update(), только если исходный файл
+    не сменился, пока копии строились.
+    """
+    instance = model.objects.filter(pk=pk).first()
+    if instance is None:
+        return
+    generation, renditions = RENDITIONS[model]
+    stale = get_stale_renditions(instance)
+    updates, sources, old_names = {}, {}, []
+    for source_field, rendition_field, size_name, size in renditions:
+        if not force and rendition_field not in stale:
+            continue
+        source = getattr(instance, source_field)
+        rendition = getattr(instance, rendition_field)
+        sources[source_field] = source.name
+        name = ''
+        if source:
+            name = get_rendition_name(
+                instance, source_field, rendition_field, size_name)
+            if force or not rendition.storage.exists(name):
+                rendition.storage.delete(name)
+                rendition.storage.save(name, make_rendition(source, size))
+        if rendition and rendition.name != name:
+            old_names.append((rendition.storage, rendition.name))
+        updates[rendition_field] = name
+    if not updates:
+        return
+    if model.objects.filter(pk=pk, **sources).update(**updates):
+        for storage, name in old_names:
+            storage.delete(name)
+        bump_generation(RECIPES, generation(pk))
+
+
+def process_renditions_in_thread(model, pk):
+    try:
+        process_renditions(model, pk)
+    except Exception:
+        logger.exception('Не удалось построить копии картинок %s %s',
+                         model._meta.label, pk)
+    finally:
+        connection.close()
+
+
+def schedule_renditions(instance):
+    """Ставит построение копий в очередь после фиксации транзакции."""
+    if not get_stale_renditions(instance):
+        return
+    model, pk = instance._meta.concrete_model, instance.pk
+    instance._pending_renditions = True
+
+    def submit():
+        if settings.IMAGE_WORKERS:
+            get_executor().submit(process_renditions_in_thread, model, pk)
+        else:
+            process_renditions(model, pk)
+
+    transaction.on_commit(submit)
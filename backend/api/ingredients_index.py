@@ -0,0 +1,54 @@
+import threading
+from bisect import bisect_left
+
+from api.cache import CATALOG, get_generation
+from api.constant import INGREDIENTS_SEARCH_LIMIT
+from recipes.models import Ingredient
+
+
+class IngredientPrefixIndex:
+    """Индекс ингредиентов в памяти процесса для поиска по началу названия.
+
+    Строится одним запросом к базе и перестраивается, когда меняется
+    поколение CATALOG, в том числе после импорта из другого процесса
+    (с LocMemCache — не позже чем через GENERATIONS_TIMEOUT).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._generation = None
+        self._entries = None
+
+    @staticmethod
+    def _build():
+        rows = sorted(
+            Ingredient.objects.values('id', 'name', 'measurement_unit'),
+            key=lambda row: (row['name'].lower(), row['id']),
+        )
+        return [row['name'].lower() for row in rows], rows
+
+    def _get_entries(self):
+        generation = get_generation(CATALOG)
+        if self._generation != generation:
+            with self._lock:
+                if self._generation != generation:
+                    self._entries = self._build()
+                    self._generation = generation
+        return self._entries
+
+    def search(self, prefix, limit=INGREDIENTS_SEARCH_LIMIT):
+        """Ингредиенты, название которых начинается с prefix."""
+        keys, rows = self._get_entries()
+        prefix = prefix.lower()
+        result = []
+        position = bisect_left(keys, prefix)
+        while (
+            position < len(keys) and len(result) < limit
+            and keys[position].startswith(prefix)
+        ):
+            result.append(rows[position])
+            position += 1
+        return result
+
+
+ingredients_index = IngredientPrefixIndex()
@@ -0,0 +1,146 @@
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                patch_vary_headers)
+from django.utils.http import quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+from api.cache import (get_generation, get_response_cache_key, incr_stat,
+                       make_digest, user_state_generation)
+
+
+class ConditionalGetMixin:
+    """Условные GET-запросы для list и retrieve.
+
+    ETag строится из счётчиков поколений в кэше, без запросов к базе.
+    При совпадении валидатора 304 отдаётся без сериализации.
+    """
+
+    # Имя поколения кэша, от которого зависит ответ.
+    etag_generation = None
+    # Ответ зависит от избранного, списка покупок и подписок пользователя.
+    user_dependent = False
+    # Время жизни ответа для анонимов в общих кэшах (nginx).
+    public_max_age = 0
+
+    def get_extra_generations(self, request):
+        """Поколения, от которых ответ зависит при этих параметрах."""
+        return ()
+
+    def get_etag(self, request):
+        parts = [get_generation(self.etag_generation),
+                 request.get_full_path()]
+        parts += [
+            get_generation(name)
+            for name in self.get_extra_generations(request)
+        ]
+        if self.user_dependent and request.user.is_authenticated:
+            parts += [
+                request.user.pk,
+                get_generation(user_state_generation(request.user.pk)),
+            ]
+        return quote_etag(make_digest(*parts))
+
+    def get_conditional(self, handler, request, *args, **kwargs):
+        etag = self.get_etag(request)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+        if response.status_code not in (
+            status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED
+        ):
+            return response
+        response['ETag'] = etag
+        if request.user.is_authenticated:
+            patch_cache_control(response, private=True, no_cache=True)
+        else:
+            patch_cache_control(
+                response, public=True, max_age=self.public_max_age)
+        patch_vary_headers(response, ('Authorization',))
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.get_conditional(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_conditional(
+            super().retrieve, request, *args, **kwargs)
+
+
+class AnonymousCacheMixin:
+    """Кэш ответов list и retrieve для анонимных пользователей."""
+
+    # Имя поколения кэша, при смене которого ответы устаревают.
+    response_cache_generation = None
+    response_cache_timeout = None
+
+    def get_extra_generations(self, request):
+        """Поколения, от которых ответ зависит при этих параметрах."""
+        return ()
+
+    def get_anonymous_cached(self, handler, request, *args, **kwargs):
+        """Отдаёт ответ для анонимов из кэша или кладёт его туда."""
+        if request.user.is_authenticated:
+            return handler(request, *args, **kwargs)
+        name = self.response_cache_generation
+        key = get_response_cache_key(
+            request, name, self.get_extra_generations(request))
+        data = cache.get(key)
+        if data is not None:
+            incr_stat(name, 'hits')
+            return Response(data)
+        incr_stat(name, 'misses')
+        response = handler(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            cache.set(key, response.data, self.response_cache_timeout)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.get_anonymous_cached(
+            super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_anonymous_cached(
+            super().retrieve, request, *args, **kwargs)
+
+
+class CatalogSnapshotMixin(ConditionalGetMixin):
+    """Список справочника без параметров отдаётся из готового снимка.
+
+    ETag — хэш содержимого, одинаковый во всех процессах.
+    """
+
+    catalog_snapshot = None
+
+    def is_snapshot_request(self, request):
+        return self.action == 'list' and not request.query_params
+
+    def get_snapshot(self):
+        if not hasattr(self, '_snapshot'):
+            self._snapshot = self.catalog_snapshot.get()
+        return self._snapshot
+
+    def get_etag(self, request):
+        if self.is_snapshot_request(request):
+            return self.get_snapshot().etag
+        return super().get_etag(request)
+
+    def get_snapshot_response(self, request, *args, **kwargs):
+        snapshot = self.get_snapshot()
+        accept_encoding = request.META.get('HTTP_ACCEPT_ENCODING', '')
+        if 'gzip' in accept_encoding:
+            response = HttpResponse(
+                snapshot.compressed, content_type='application/json')
+            response['Content-Encoding'] = 'gzip'
+        else:
+            response = HttpResponse(
+                snapshot.content, content_type='application/json')
+        patch_vary_headers(response, ('Accept-Encoding',))
+        return response
+
+    def list(self, request, *args, **kwargs):
+        if self.is_snapshot_request(request):
+            return self.get_conditional(
+                self.get_snapshot_response, request, *args, **kwargs)
+        return super().list(request, *args, **kwargs)
@@ -1,8 +1,118 @@
+import base64
+import binascii
+
+from django.core.paginator import Paginator
+from django.db.models import Q, QuerySet
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from api.cache import get_cached_count
+from api.constant import MAX_PAGE_SIZE, PAGINATOR_PAGE_SIZE
+
+
+class CachedCountPaginator(Paginator):
+    """Paginator, который берёт общее число объектов из кэша."""
 
-from api.constant import PAGINATOR_PAGE_SIZE
+    @cached_property
+    def count(self):
+        if isinstance(self.object_list, QuerySet):
+            return get_cached_count(self.object_list)
+        return super().count
 
 
 class FoodgramPagination(PageNumberPagination):
+    django_paginator_class = CachedCountPaginator
     page_size_query_param = 'limit'
     page_size = PAGINATOR_PAGE_SIZE  # 6
+    max_page_size = MAX_PAGE_SIZE
+
+
+class RecipePagination(FoodgramPagination):
+    """Пагинация рецептов.
+
+    По умолчанию постраничная (page/limit). С параметром cursor
+    (первая страница — пустой cursor) включается выдача по ключу
+    (pub_date, id): без COUNT(*) и OFFSET, с одинаковой скоростью
+    на любой глубине ленты.
+    """
+
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Неверный курсор.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_mode = self.cursor_query_param in request.query_params
+        if not self.cursor_mode:
+            return super().paginate_queryset(queryset, request, view)
+        self.request = request
+        page_size = self.get_page_size(request)
+        reverse, position = self.decode_cursor(
+            request.query_params[self.cursor_query_param])
+        queryset = queryset.order_by('-pub_date', '-id')
+        if position is not None:
+            pub_date, pk = position
+            if reverse:
+                queryset = queryset.filter(pub_date__gte=pub_date).filter(
+                    Q(pub_date__gt=pub_date) | Q(id__gt=pk)
+                ).order_by('pub_date', 'id')
+            else:
+                queryset = queryset.filter(pub_date__lte=pub_date).filter(
+                    Q(pub_date__lt=pub_date) | Q(id__lt=pk)
+                )
+        results = list(queryset[:page_size + 1])
+        has_more = len(results) > page_size
+        results = results[:page_size]
+        if reverse:
+            results.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, position is not None
+        self.next_cursor = (
+            self.encode_cursor(False, results[-1])
+            if has_next and results else None
+        )
+        self.previous_cursor = (
+            self.encode_cursor(True, results[0])
+            if has_previous and results else None
+        )
+        return results
+
+    def decode_cursor(self, encoded):
+        if not encoded:
+            return False, None
+        try:
+            direction, pub_date, pk = base64.urlsafe_b64decode(
+                encoded.encode()).decode().split('|')
+            pub_date = parse_datetime(pub_date)
+            pk = int(pk)
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if pub_date is None or direction not in ('n', 'p'):
+            raise NotFound(self.invalid_cursor_message)
+        return direction == 'p', (pub_date, pk)
+
+    @staticmethod
+    def encode_cursor(reverse, recipe):
+        direction = 'p' if reverse else 'n'
+        return base64.urlsafe_b64encode(
+            f'{direction}|{recipe.pub_date.isoformat()}|{recipe.pk}'.encode()
+        ).decode()
+
+    def get_cursor_link(self, cursor):
+        if cursor is None:
+            return None
+        url = remove_query_param(
+            self.request.build_absolute_uri(), self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_paginated_response(self, data):
+        if not self.cursor_mode:
+            return super().get_paginated_response(data)
+        return Response({
+            'next': self.get_cursor_link(self.next_cursor),
+            'previous': self.get_cursor_link(self.previous_cursor),
+            'results': data,
+        })
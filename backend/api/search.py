@@ -0,0 +1,126 @@
+from django.db import connection
+from django.db.models import BooleanField, FloatField, Value
+from django.db.models.expressions import RawSQL
+
+from api.constant import SEARCH_BATCH_SIZE
+from api.utils import batched
+from recipes.models import Recipe
+
+SEARCH_CONFIG = 'russian'
+SQLITE_SEARCH_TABLE = 'recipe_search'
+# Веса столбцов name, ingredients, text для bm25 — как A, B, C в PostgreSQL.
+SQLITE_RANK_WEIGHTS = '10.0, 4.0, 1.0'
+
+# Вес A — название, B — ингредиенты, C — описание.
+POSTGRESQL_UPDATE_SQL = f'''
+    UPDATE recipes_recipe SET search_vector =
+        setweight(to_tsvector('{SEARCH_CONFIG}', name), 'A')
+        || setweight(to_tsvector('{SEARCH_CONFIG}', coalesce((
+            SELECT string_agg(ingredient.name, ' ')
+            FROM recipes_ingredientsrecipe AS item
+            JOIN recipes_ingredient AS ingredient
+                ON ingredient.id = item.ingredient_id
+            WHERE item.recipe_id = recipes_recipe.id
+        ), '')), 'B')
+        || setweight(to_tsvector('{SEARCH_CONFIG}', text), 'C')
+    WHERE id = ANY(%s)
+'''
+SQLITE_INSERT_SQL = f'''
+    INSERT INTO {SQLITE_SEARCH_TABLE} (rowid, name, ingredients, text)
+    SELECT recipe.id, recipe.name, coalesce((
+        SELECT group_concat(ingredient.name, ' ')
+        FROM recipes_ingredientsrecipe AS item
+        JOIN recipes_ingredient AS ingredient
+            ON ingredient.id = item.ingredient_id
+        WHERE item.recipe_id = recipe.id
+    ), ''), recipe.text
+    FROM recipes_recipe AS recipe
+    WHERE recipe.id IN ({{placeholders}})
+'''
+
+_sqlite_search_table = None
+
+
+def get_search_backend():
+    """'postgresql', 'sqlite' (FTS5) или None для поиска по LIKE."""
+    global _sqlite_search_table
+    if connection.vendor == 'postgresql':
+        return 'postgresql'
+    if connection.vendor == 'sqlite':
+        if _sqlite_search_table is None:
+            _sqlite_search_table = (
+                SQLITE_SEARCH_TABLE
+                in connection.introspection.table_names()
+            )
+        if _sqlite_search_table:
+            return 'sqlite'
+    return None
+
+
+def get_fts5_query(query):
+    """Слова запроса как префиксы в кавычках: спецсимволы FTS5
+    из пользовательского ввода не интерпретируются."""
+    return ' '.join(
+        '"{}"*'.format(word.replace('"', '""')) for word in query.split()
+    )
+
+
+def search_recipes(queryset, query):
+    """Рецепты, подходящие под запрос, с релевантностью search_rank."""
+    backend = get_search_backend()
+    if backend == 'postgresql':
+        tsquery = f"websearch_to_tsquery('{SEARCH_CONFIG}', %s)"
+        return queryset.filter(RawSQL(
+            f'"recipes_recipe"."search_vector" @@ {tsquery}',
+            (query,), output_field=BooleanField(),
+        )).annotate(search_rank=RawSQL(
+            f'ts_rank("recipes_recipe"."search_vector", {tsquery})',
+            (query,), output_field=FloatField(),
+        ))
+    if backend == 'sqlite':
+        match = get_fts5_query(query)
+        return queryset.filter(pk__in=RawSQL(
+            f'SELECT rowid FROM {SQLITE_SEARCH_TABLE} '
+            f'WHERE {SQLITE_SEARCH_TABLE} MATCH %s',
+            (match,),
+        )).annotate(search_rank=RawSQL(
+            f'SELECT -bm25({SQLITE_SEARCH_TABLE}, {SQLITE_RANK_WEIGHTS}) '
+            f'FROM {SQLITE_SEARCH_TABLE} '
+            f'WHERE {SQLITE_SEARCH_TABLE} MATCH %s '
+            f'AND rowid = "recipes_recipe"."id"',
+            (match,), output_field=FloatField(),
+        ))
+    return queryset.filter(name__icontains=query).annotate(
+        search_rank=Value(0.0, output_field=FloatField()))
+
+
+def update_search_index(recipe_ids):
+    """Пересчитывает поисковые данные рецептов после записи."""
+    backend = get_search_backend()
+    if backend is None:
+        return
+    for ids in batched(recipe_ids, SEARCH_BATCH_SIZE):
+        with connection.cursor() as cursor:
+            if backend == 'postgresql':
+                cursor.execute(POSTGRESQL_UPDATE_SQL, (ids,))
+            elif backend == 'sqlite':
+                placeholders = ', '.join(['%s'] * len(ids))
+                cursor.execute(
+                    f'DELETE FROM {SQLITE_SEARCH_TABLE} '
+                    f'WHERE rowid IN ({placeholders})',
+                    ids,
+                )
+                cursor.execute(
+                    SQLITE_INSERT_SQL.format(placeholders=placeholders), ids)
+
+
+def rebuild_search_index():
+    """Заполняет поисковые данные всех рецептов заново."""
+    if get_search_backend() == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {SQLITE_SEARCH_TABLE} WHERE rowid NOT IN '
+                '(SELECT id FROM recipes_recipe)'
+            )
+    update_search_index(
+        Recipe.objects.values_list('pk', flat=True).iterator())
@@ -1,12 +1,26 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, models, transaction
 from djoser.serializers import UserSerializer
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
 from rest_framework.validators import UniqueTogetherValidator
 
+from api.cache import (COUNTS, RECIPES, bump_generation,
+                       get_recipe_fragment_keys)
 from api.constant import WRONGUSERNAME
-from api.fields import Base64ImageField
+from api.cooking_index import schedule_cooking_index_update
+from api.fields import (Base64ImageField, BatchPrimaryKeyRelatedField,
+                        load_related)
+from api.images import has_pending_renditions, schedule_renditions
+from api.search import update_search_index
+from api.short_links import encode_short_link
+from api.utils import get_followed_author_ids, get_recipes_limit
 from recipes.models import (Favorite, Ingredient, IngredientsRecipe, Recipe,
-                            ShoppingList, Tag)
+                            ShoppingList, Tag, TagsRecipe)
+from recipes.services import (change_counter, get_amounts_delta,
+                              get_cart_author_ids, update_recipe_ingredients,
+                              update_recipe_tags, update_shopping_cart_totals)
 from user.models import Follow, User
 
 
@@ -14,7 +28,8 @@ class UserFoodgramSerializer(UserSerializer):
     """Сериализатор для отображения пользователя."""
 
     is_subscribed = serializers.SerializerMethodField()
-    avatar = Base64ImageField(required=False, allow_null=True)
+    avatar = Base64ImageField(
+        required=False, allow_null=True, rendition='avatar_thumbnail')
 
     class Meta:
         fields = ('email', 'id', 'username', 'first_name',
@@ -22,9 +37,7 @@ class UserFoodgramSerializer(UserSerializer):
         model = User
 
     def get_is_subscribed(self, obj):
-        user = self.context.get('request').user
-        return user.is_authenticated and Follow.objects.filter(
-            subscriber=user, author=obj).exists()
+        return obj.id in get_followed_author_ids(self.context.get('request'))
 
 
 class UserAvatar(serializers.ModelSerializer):
@@ -78,7 +91,7 @@ class UserFoodgramCreateSerializer(UserSerializer):
 class FavoriteAndShoppingCartSerializer(serializers.ModelSerializer):
     """Сериализатор для избранного рецептов."""
 
-    image = Base64ImageField()
+    image = Base64ImageField(rendition='image_thumbnail')
 
     class Meta:
         model = Recipe
@@ -89,7 +102,7 @@ class FollowShowSerializer(UserFoodgramSerializer):
     """Сериализатор отображения подписок."""
 
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
+    recipes_count = serializers.ReadOnlyField()
 
     class Meta:
         model = User
@@ -99,16 +112,17 @@ class FollowShowSerializer(UserFoodgramSerializer):
 
     def get_recipes(self, obj):
         request = self.context.get('request')
-        author_recipes = obj.recipes.all()
-        limit = request.query_params.get('recipes_limit')
-        if limit and limit.isdigit():
-            author_recipes = author_recipes[:int(limit)]
+        recipes_by_author = self.context.get('recipes_by_author')
+        if recipes_by_author is not None:
+            author_recipes = recipes_by_author.get(obj.id, [])
+        else:
+            author_recipes = obj.recipes.all()
+            limit = get_recipes_limit(request)
+            if limit is not None:
+                author_recipes = author_recipes[:limit]
         return FavoriteAndShoppingCartSerializer(
             author_recipes, context={'request': request}, many=True).data
 
-    def get_recipes_count(self, obj):
-        return obj.recipes.count()
-
 
 class FollowSerializer(serializers.ModelSerializer):
     """Сериализатор для представления подписчиков."""
@@ -198,16 +212,37 @@ class IngredientsSerializer(serializers.ModelSerializer):
         model = Ingredient
 
 
+class IngredientsRecipeListSerializer(serializers.ListSerializer):
+    """Ингредиенты рецепта, проверяемые одним запросом на все id."""
+
+    def to_internal_value(self, data):
+        if isinstance(data, list):
+            missing = load_related(
+                self.context,
+                'ingredients_by_id',
+                Ingredient.objects.all(),
+                (item.get('id') for item in data if isinstance(item, dict)),
+            )
+            if missing:
+                raise ValidationError(
+                    'Не найдены ингредиенты с id: '
+                    + ', '.join(str(pk) for pk in missing) + '.'
+                )
+        return super().to_internal_value(data)
+
+
 class IngredientsRecipeSerializerPOST(serializers.ModelSerializer):
     """Сериализатор для создания ингредиентов рецептов."""
 
-    id = serializers.PrimaryKeyRelatedField(
-        queryset=Ingredient.objects.all()
+    id = BatchPrimaryKeyRelatedField(
+        queryset=Ingredient.objects.all(),
+        context_key='ingredients_by_id',
     )
 
     class Meta:
         fields = ('id', 'amount',)
         model = IngredientsRecipe
+        list_serializer_class = IngredientsRecipeListSerializer
 
 
 class IngredientsRecipeSerializerGET(serializers.ModelSerializer):
@@ -224,13 +259,27 @@ class IngredientsRecipeSerializerGET(serializers.ModelSerializer):
         model = IngredientsRecipe
 
 
+class RecipeListSerializer(serializers.ListSerializer):
+    """Список рецептов с общей частью представления из кэша."""
+
+    def to_representation(self, data):
+        recipes = data.all() if isinstance(data, models.Manager) else data
+        return self.child.to_representation_many(recipes)
+
+
 class RecipeSerializerGET(serializers.ModelSerializer):
-    """Сериализатор для чтения рецептов."""
+    """Сериализатор для чтения рецептов.
+
+    Всё, кроме флагов избранного, списка покупок и подписки на автора,
+    одинаково для всех пользователей: эта часть кэшируется по рецепту,
+    а флаги подставляются при каждом ответе.
+    """
 
     author = UserFoodgramSerializer()
     ingredients = IngredientsRecipeSerializerGET(
         required=True, many=True, source='recipe_ingredients',)
     tags = TagsSerializer(many=True, read_only=True)
+    image = Base64ImageField(rendition='image_large', read_only=True)
     is_in_shopping_cart = serializers.SerializerMethodField(read_only=True)
     is_favorited = serializers.SerializerMethodField(read_only=True)
 
@@ -240,9 +289,12 @@ class RecipeSerializerGET(serializers.ModelSerializer):
             'is_in_shopping_cart', 'name', 'image', 'text', 'cooking_time',
         )
         model = Recipe
+        list_serializer_class = RecipeListSerializer
 
     def get_is_in_shopping_cart(self, obj):
         """Для вывода в списке покупок."""
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         request = self.context.get('request')
         return (
             request and request.user.is_authenticated
@@ -251,12 +303,54 @@ class RecipeSerializerGET(serializers.ModelSerializer):
 
     def get_is_favorited(self, obj):
         """Для вывода избранного."""
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         request = self.context.get('request')
         return (
             request and request.user.is_authenticated
             and request.user.favorites.filter(recipe=obj).exists()
         )
 
+    def get_fragment(self, recipe):
+        """Представление рецепта без пользовательских флагов."""
+        data = super().to_representation(recipe)
+        data['is_favorited'] = data['is_in_shopping_cart'] = None
+        data['author']['is_subscribed'] = None
+        return data
+
+    def add_user_fields(self, fragment, recipe):
+        data = {
+            **fragment,
+            'is_favorited': self.get_is_favorited(recipe),
+            'is_in_shopping_cart': self.get_is_in_shopping_cart(recipe),
+        }
+        data['author'] = {
+            **fragment['author'],
+            'is_subscribed': recipe.author_id in get_followed_author_ids(
+                self.context.get('request')),
+        }
+        return data
+
+    def to_representation_many(self, recipes):
+        request = self.context.get('request')
+        keys = get_recipe_fragment_keys(
+            recipes, request.build_absolute_uri('/') if request else '')
+        fragments = cache.get_many(keys.values())
+        new_fragments = {}
+        result = []
+        for recipe in recipes:
+            key = keys[recipe.pk]
+            if key not in fragments:
+                fragments[key] = self.get_fragment(recipe)
+                if not has_pending_renditions(recipe):
+                    new_fragments[key] = fragments[key]
+            result.append(self.add_user_fields(fragments[key], recipe))
+        cache.set_many(new_fragments, settings.RECIPE_FRAGMENT_TIMEOUT)
+        return result
+
+    def to_representation(self, recipe):
+        return self.to_representation_many([recipe])[0]
+
 
 class RecipeSerializerPOST(serializers.ModelSerializer):
     """Сериализатор для создания рецептов."""
@@ -265,9 +359,10 @@ class RecipeSerializerPOST(serializers.ModelSerializer):
     author = UserFoodgramSerializer(read_only=True)
     ingredients = IngredientsRecipeSerializerPOST(
         many=True, write_only=True)
-    tags = serializers.PrimaryKeyRelatedField(
+    tags = BatchPrimaryKeyRelatedField(
         queryset=Tag.objects.all(),
         many=True,
+        context_key='tags_by_id',
     )
 
     class Meta:
@@ -312,35 +407,100 @@ class RecipeSerializerPOST(serializers.ModelSerializer):
             )
         return value
 
+    @transaction.atomic
     def create(self, validated_data):
         """Для создания рецептов."""
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
-        recipe = Recipe.objects.create(
-            author=self.context.get('request').user,
-            **validated_data,
-        )
+        author = self.context.get('request').user
+        recipe = Recipe.objects.create(author=author, **validated_data)
         self.add_ingredients_and_tags(
             ingredients,
             tags,
             recipe
         )
+        schedule_cooking_index_update(
+            [recipe.pk], [ingredient['id'].id for ingredient in ingredients])
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        """Для обновления рецептов."""
-        instance.ingredients.clear()
-        instance.tags.clear()
-        ingredients = validated_data.pop('ingredients')
-        tags = validated_data.pop('tags')
-        self.add_ingredients_and_tags(
-            ingredients,
-            tags,
-            instance,
+        """Для обновления рецептов.
+
+        Ингредиенты и теги сравниваются с сохранёнными, и меняются только
+        отличающиеся строки. Кэш сбрасывают сигналы сохранения рецепта.
+        """
+        new_amounts = {
+            item['id'].id: item['amount']
+            for item in validated_data.pop('ingredients')
+        }
+        old_amounts = update_recipe_ingredients(instance, new_amounts)
+        schedule_cooking_index_update(
+            [instance.pk], old_amounts.keys() | new_amounts)
+        update_recipe_tags(
+            instance, {tag.id for tag in validated_data.pop('tags')})
+        update_shopping_cart_totals(
+            get_cart_author_ids(instance),
+            get_amounts_delta(old_amounts, new_amounts),
         )
         return super().update(instance, validated_data)
 
+    @classmethod
+    def create_many(cls, serializers, author):
+        """Создаёт проверенные рецепты пачкой, по INSERT на таблицу.
+
+        Сигналы при bulk_create не срабатывают, поэтому кэш сбрасывается,
+        счётчик рецептов автора меняется и копии картинок ставятся
+        в очередь здесь. Если база не
+        возвращает id из bulk_create, рецепты сохраняются по одному.
+        """
+        if not connection.features.can_return_rows_from_bulk_insert:
+            return [serializer.save() for serializer in serializers]
+        items = [dict(serializer.validated_data) for serializer in serializers]
+        relations = [
+            (item.pop('ingredients'), item.pop('tags')) for item in items
+        ]
+        recipes = Recipe.objects.bulk_create(
+            Recipe(author=author, **item) for item in items)
+        for recipe in recipes:
+            recipe.short_link = encode_short_link(recipe.pk)
+        Recipe.objects.bulk_update(recipes, ('short_link',))
+        IngredientsRecipe.objects.bulk_create(
+            IngredientsRecipe(
+                ingredient=ingredient['id'],
+                recipe=recipe,
+                amount=ingredient['amount'],
+            )
+            for recipe, (ingredients, _) in zip(recipes, relations)
+            for ingredient in ingredients
+        )
+        TagsRecipe.objects.bulk_create(
+            TagsRecipe(name=tag, recipe=recipe)
+            for recipe, (_, tags) in zip(recipes, relations)
+            for tag in tags
+        )
+        change_counter(User, author.pk, 'recipes_count', len(recipes))
+        recipe_ids = [recipe.pk for recipe in recipes]
+        schedule_cooking_index_update(recipe_ids, {
+            ingredient['id'].id
+            for ingredients, _ in relations for ingredient in ingredients
+        })
+        transaction.on_commit(lambda: update_search_index(recipe_ids))
+        for recipe in recipes:
+            schedule_renditions(recipe)
+        transaction.on_commit(lambda: bump_generation(COUNTS, RECIPES))
+        return recipes
+
     def to_representation(self, recipe):
         """Переопределяет сериализатор для чтения."""
+        models.prefetch_related_objects(
+            [recipe],
+            'tags',
+            models.Prefetch(
+                'recipe_ingredients',
+                queryset=IngredientsRecipe.objects.select_related(
+                    'ingredient'),
+            ),
+        )
         serializer = RecipeSerializerGET(recipe, context=self.context)
         return serializer.data
@@ -0,0 +1,50 @@
+from functools import lru_cache
+from string import ascii_letters, digits
+
+from api.constant import SHORT_LINK_CACHE_SIZE
+from recipes.models import Recipe
+
+ALPHABET = digits + ascii_letters
+BASE = len(ALPHABET)
+# Коды из id начинаются с четырёх символов и не пересекаются
+# со старыми трёхсимвольными случайными кодами.
+OFFSET = BASE ** 3
+
+
+def encode_short_link(pk):
+    """Код короткой ссылки рецепта в base62."""
+    number = pk + OFFSET
+    code = ''
+    while number:
+        number, remainder = divmod(number, BASE)
+        code = ALPHABET[remainder] + code
+    return code
+
+
+def decode_short_link(code):
+    """Id рецепта по коду или None, если код не из base62 по id."""
+    number = 0
+    for char in code:
+        position = ALPHABET.find(char)
+        if position == -1:
+            return None
+        number = number * BASE + position
+    if number < OFFSET:
+        return None
+    return number - OFFSET
+
+
+@lru_cache(maxsize=SHORT_LINK_CACHE_SIZE)
+def get_legacy_recipe_pk(code):
+    """Id рецепта по старому случайному коду, один запрос на код."""
+    return Recipe.objects.filter(
+        short_link=code).values_list('pk', flat=True).first()
+
+
+def get_recipe_pk(code):
+    """Id рецепта по коду короткой ссылки без обращения к базе,
+    кроме первого запроса по старому коду."""
+    pk = decode_short_link(code)
+    if pk is None:
+        return get_legacy_recipe_pk(code)
+    return pk
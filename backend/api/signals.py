@@ -0,0 +1,217 @@
+from django.db import transaction
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete, pre_save)
+from django.dispatch import receiver
+
+from api.cache import (CATALOG, COUNTS, RECIPES, bump_generation,
+                       recipe_generation, user_generation,
+                       user_state_generation)
+from api.cooking_index import schedule_cooking_index_update
+from api.images import schedule_renditions
+from api.search import update_search_index
+from api.short_links import encode_short_link
+from recipes.models import (Favorite, Ingredient, IngredientsRecipe, Recipe,
+                            ShoppingList, Tag, TagsRecipe)
+from recipes.services import (add_to_shopping_cart_totals, change_counter,
+                              remove_from_shopping_cart_totals)
+from user.models import Follow, User
+
+
+def bump_generation_on_commit(*names):
+    """Сбрасывает кэш после фиксации транзакции, а не посреди записи."""
+    transaction.on_commit(lambda: bump_generation(*names))
+
+
+def is_login_save(update_fields):
+    """Вход пользователя сохраняет только last_login."""
+    return bool(update_fields) and set(update_fields) <= {'last_login'}
+
+
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingList)
+@receiver(post_save, sender=Follow)
+def invalidate_counts_on_create(created, **kwargs):
+    if created:
+        bump_generation_on_commit(COUNTS)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=TagsRecipe)
+@receiver(m2m_changed, sender=TagsRecipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=User)
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingList)
+@receiver(post_delete, sender=Follow)
+@receiver(post_delete, sender=TagsRecipe)
+def invalidate_counts(**kwargs):
+    bump_generation_on_commit(COUNTS)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=IngredientsRecipe)
+@receiver(post_save, sender=TagsRecipe)
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(m2m_changed, sender=TagsRecipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=IngredientsRecipe)
+@receiver(post_delete, sender=TagsRecipe)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+@receiver(post_delete, sender=User)
+def invalidate_recipes(**kwargs):
+    bump_generation_on_commit(RECIPES)
+
+
+@receiver(post_save, sender=User)
+def invalidate_recipes_on_profile_change(
+        instance, update_fields=None, **kwargs):
+    if not is_login_save(update_fields):
+        bump_generation_on_commit(RECIPES, user_generation(instance.pk))
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def invalidate_recipe_fragment(instance, **kwargs):
+    bump_generation_on_commit(recipe_generation(instance.pk))
+
+
+@receiver(post_save, sender=IngredientsRecipe)
+@receiver(post_save, sender=TagsRecipe)
+@receiver(post_delete, sender=IngredientsRecipe)
+@receiver(post_delete, sender=TagsRecipe)
+def invalidate_recipe_fragment_by_relation(instance, **kwargs):
+    bump_generation_on_commit(recipe_generation(instance.recipe_id))
+
+
+@receiver(m2m_changed, sender=TagsRecipe)
+def invalidate_recipe_fragment_by_tags(instance, action, reverse, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if reverse:
+        bump_generation_on_commit(CATALOG)
+    else:
+        bump_generation_on_commit(recipe_generation(instance.pk))
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_catalog(**kwargs):
+    bump_generation_on_commit(CATALOG)
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingList)
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingList)
+def invalidate_user_state(instance, **kwargs):
+    bump_generation_on_commit(user_state_generation(instance.author_id))
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_user_state_by_follow(instance, **kwargs):
+    bump_generation_on_commit(user_state_generation(instance.subscriber_id))
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=User)
+def create_image_renditions(instance, update_fields=None, **kwargs):
+    if not is_login_save(update_fields):
+        schedule_renditions(instance)
+
+
+@receiver(post_save, sender=Recipe)
+def create_short_link(instance, created, **kwargs):
+    if created and not instance.short_link:
+        instance.short_link = encode_short_link(instance.pk)
+        Recipe.objects.filter(pk=instance.pk).update(
+            short_link=instance.short_link)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def update_recipe_search(instance, **kwargs):
+    pk = instance.pk
+    transaction.on_commit(lambda: update_search_index([pk]))
+
+
+@receiver(pre_delete, sender=Recipe)
+def remember_recipe_ingredients(instance, **kwargs):
+    instance._cooking_ingredient_ids = list(
+        IngredientsRecipe.objects.filter(
+            recipe=instance
+        ).values_list('ingredient_id', flat=True)
+    )
+
+
+@receiver(post_delete, sender=Recipe)
+def remove_recipe_from_cooking_index(instance, **kwargs):
+    schedule_cooking_index_update(
+        [instance.pk], getattr(instance, '_cooking_ingredient_ids', ()))
+
+
+@receiver(post_save, sender=ShoppingList)
+def add_recipe_to_cart_totals(instance, created, **kwargs):
+    if created:
+        add_to_shopping_cart_totals(instance.author_id, instance.recipe_id)
+
+
+@receiver(pre_delete, sender=ShoppingList)
+def remove_recipe_from_cart_totals(instance, **kwargs):
+    """До удаления: при каскаде от рецепта его ингредиенты ещё на месте."""
+    remove_from_shopping_cart_totals(instance.author_id, instance.recipe_id)
+
+
+# Счётчик, который меняет связанная строка: (модель, поле, поле связи).
+COUNTERS_BY_SENDER = {
+    Favorite: (Recipe, 'favorites_count', 'recipe_id'),
+    ShoppingList: (Recipe, 'in_carts_count', 'recipe_id'),
+    Recipe: (User, 'recipes_count', 'author_id'),
+    Follow: (User, 'followers_count', 'author_id'),
+}
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingList)
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Follow)
+def increment_counter(sender, instance, created, **kwargs):
+    if created:
+        model, field, relation = COUNTERS_BY_SENDER[sender]
+        change_counter(model, getattr(instance, relation), field, 1)
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingList)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Follow)
+def decrement_counter(sender, instance, **kwargs):
+    """В том числе при каскаде от рецепта или пользователя."""
+    model, field, relation = COUNTERS_BY_SENDER[sender]
+    change_counter(model, getattr(instance, relation), field, -1)
+
+
+@receiver(pre_save, sender=Recipe)
+def remember_recipe_author(instance, update_fields=None, **kwargs):
+    """Прежний автор, если рецепт может перейти к другому."""
+    if instance._state.adding or (
+        update_fields is not None and 'author' not in update_fields
+    ):
+        return
+    instance._previous_author_id = Recipe.objects.filter(
+        pk=instance.pk).values_list('author_id', flat=True).first()
+
+
+@receiver(post_save, sender=Recipe)
+def move_recipe_counter(instance, created, **kwargs):
+    previous_author_id = getattr(instance, '_previous_author_id', None)
+    instance._previous_author_id = None
+    if created or previous_author_id in (None, instance.author_id):
+        return
+    change_counter(User, previous_author_id, 'recipes_count', -1)
+    change_counter(User, instance.author_id, 'recipes_count', 1)
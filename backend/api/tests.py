@@ -0,0 +1,99 @@
+from django.core.cache import caches
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from api.cooking_index import rank_recipes, update_cooking_index
+from recipes.models import (Favorite, Ingredient, IngredientsRecipe, Recipe,
+                            ShoppingList, Tag, TagsRecipe)
+from user.models import Follow, User
+
+RECIPES_URL = '/api/recipes/'
+RECIPES_TOTAL = 5
+
+
+class RecipeListQueriesTest(APITestCase):
+    """Число запросов списка рецептов не зависит от размера страницы."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(
+            username='reader', email='reader@foodgram.local',
+            first_name='Читатель', last_name='Рецептов',
+        )
+        authors = [
+            User.objects.create(
+                username=f'author_{number}',
+                email=f'author_{number}@foodgram.local',
+                first_name='Автор', last_name=str(number),
+            )
+            for number in range(2)
+        ]
+        Follow.objects.create(subscriber=cls.user, author=authors[0])
+        tags = [
+            Tag.objects.create(name=f'Тег {number}', slug=f'tag-{number}')
+            for number in range(2)
+        ]
+        ingredients = [
+            Ingredient.objects.create(
+                name=f'Ингредиент {number}', measurement_unit='г')
+            for number in range(3)
+        ]
+        for number in range(RECIPES_TOTAL):
+            recipe = Recipe.objects.create(
+                author=authors[number % len(authors)],
+                name=f'Рецепт {number}',
+                image='recipes/images/test.png',
+                text='Описание',
+                cooking_time=10,
+            )
+            for tag in tags:
+                TagsRecipe.objects.create(name=tag, recipe=recipe)
+            for amount, ingredient in enumerate(ingredients, start=1):
+                IngredientsRecipe.objects.create(
+                    ingredient=ingredient, recipe=recipe, amount=amount)
+            if number % 2:
+                Favorite.objects.create(author=cls.user, recipe=recipe)
+            else:
+                ShoppingList.objects.create(author=cls.user, recipe=recipe)
+
+    def get_queries_count(self, limit):
+        for cache in caches.all():
+            cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(RECIPES_URL, {'limit': limit})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), limit)
+        return len(context)
+
+    def test_anonymous_list_queries(self):
+        self.assertEqual(
+            self.get_queries_count(1), self.get_queries_count(RECIPES_TOTAL))
+
+    def test_authenticated_list_queries(self):
+        self.client.force_authenticate(self.user)
+        self.assertEqual(
+            self.get_queries_count(1), self.get_queries_count(RECIPES_TOTAL))
+
+
+class CookingIndexTest(APITestCase):
+    """Индекс рецептов по ингредиентам хранит id BigAutoField."""
+
+    def test_big_recipe_id(self):
+        author = User.objects.create(
+            username='cook', email='cook@foodgram.local',
+            first_name='Повар', last_name='Рецептов',
+        )
+        ingredient = Ingredient.objects.create(
+            name='Соль', measurement_unit='г')
+        recipe = Recipe.objects.create(
+            pk=2 ** 40, author=author, name='Рецепт',
+            image='recipes/images/test.png', text='Описание',
+            cooking_time=10,
+        )
+        IngredientsRecipe.objects.create(
+            ingredient=ingredient, recipe=recipe, amount=1)
+        update_cooking_index([recipe.pk], [ingredient.pk])
+        self.assertEqual(
+            list(rank_recipes([ingredient.pk])), [(recipe.pk, 1, 1)])
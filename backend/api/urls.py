@@ -4,7 +4,7 @@ from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
 from api.views import (IngredientsViewSet, RecipeViewSet, TagsViewSet,
-                       UserViewSet)
+                       UserViewSet, cache_stats)
 
 router = DefaultRouter()
 router.register('users', UserViewSet, basename='users')
@@ -16,6 +16,7 @@ router.register('ingredients', IngredientsViewSet, basename='ingredients')
 urlpatterns = [
     path('', include(router.urls)),
     path('auth/', include("djoser.urls.authtoken")),
+    path('cache-stats/', cache_stats, name='cache-stats'),
 ]
 
 if settings.DEBUG:
@@ -1,22 +1,177 @@
-from django.http import HttpResponse
+import csv
+import json
 
+from django.db import connection
+from django.db.models import F, OuterRef, Subquery, Window
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import RowNumber
+from django.http import StreamingHttpResponse
 
-def dowload_shoppig_list(self, request, ingredients):
-    response_content = "Список ингредиентов для покупоки:\n\n"
+from recipes.models import Ingredient, Recipe, Tag
+from user.models import Follow
+
+
+def batched(iterable, size):
+    """Элементы iterable списками не длиннее size."""
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def get_followed_author_ids(request):
+    """Id авторов, на которых подписан пользователь.
+
+    Загружается одним запросом и запоминается в объекте запроса,
+    чтобы все сериализаторы пользователей пользовались одним набором.
+    """
+    if request is None or not request.user.is_authenticated:
+        return frozenset()
+    if not hasattr(request, '_followed_author_ids'):
+        request._followed_author_ids = frozenset(
+            Follow.objects.filter(
+                subscriber=request.user
+            ).values_list('author_id', flat=True)
+        )
+    return request._followed_author_ids
+
+
+def get_ids(values):
+    """Целые id из присланных значений, остальное пропускается."""
+    return {
+        int(value) for value in values
+        if isinstance(value, (int, str)) and str(value).isdigit()
+    }
+
+
+def get_bulk_context(items):
+    """Теги и ингредиенты всех рецептов пачки, по запросу на модель."""
+    ingredient_ids, tag_ids = set(), set()
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        ingredients = item.get('ingredients')
+        if isinstance(ingredients, list):
+            ingredient_ids |= get_ids(
+                ingredient.get('id') for ingredient in ingredients
+                if isinstance(ingredient, dict)
+            )
+        tags = item.get('tags')
+        if isinstance(tags, list):
+            tag_ids |= get_ids(tags)
+    return {
+        'ingredients_by_id': Ingredient.objects.in_bulk(ingredient_ids),
+        'tags_by_id': Tag.objects.in_bulk(tag_ids),
+    }
+
+
+def get_recipes_limit(request):
+    """Значение параметра recipes_limit или None, если он не задан."""
+    limit = request.query_params.get('recipes_limit')
+    if limit and limit.isdigit():
+        return int(limit)
+    return None
+
+
+def get_recipes_by_author(author_ids, limit=None):
+    """Последние рецепты сразу для нескольких авторов.
+
+    Не больше limit рецептов на автора, одним запросом: на PostgreSQL
+    и свежих SQLite через ROW_NUMBER() по автору, иначе через
+    коррелированный подзапрос с LIMIT.
+    """
+    recipes = Recipe.objects.filter(author_id__in=author_ids)
+    if limit is not None:
+        if connection.features.supports_over_clause:
+            ranked_sql, params = recipes.order_by().annotate(
+                position=Window(
+                    expression=RowNumber(),
+                    partition_by=[F('author_id')],
+                    order_by=F('pub_date').desc(),
+                )
+            ).values('pk', 'position').query.sql_with_params()
+            quote = connection.ops.quote_name
+            recipes = recipes.filter(pk__in=RawSQL(
+                f'SELECT {quote("id")} FROM ({ranked_sql}) ranked '
+                f'WHERE {quote("position")} <= %s',
+                (*params, limit),
+            ))
+        else:
+            recipes = recipes.filter(pk__in=Subquery(
+                Recipe.objects.filter(
+                    author_id=OuterRef('author_id')
+                ).values('pk')[:limit]
+            ))
+    recipes_by_author = {author_id: [] for author_id in author_ids}
+    for recipe in recipes:
+        recipes_by_author[recipe.author_id].append(recipe)
+    return recipes_by_author
+
+
+class Echo:
+    """Буфер для csv.writer, который сразу отдаёт записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+def shopping_list_txt(ingredients):
+    yield 'Список ингредиентов для покупоки:\n\n'
     for item in ingredients:
-        ingredient_name = item["ingredient__name"]
-        ingredient_measurement_unit = item["ingredient__measurement_unit"]
-        ingredient_amount = item["total_amount"]
-        response_content += (
-            f'{ingredient_name}, '
-            f'{ingredient_amount}'
-            f'({ingredient_measurement_unit})\n'
+        yield (
+            f'{item["ingredient__name"]}, '
+            f'{item["total_amount"]}'
+            f'({item["ingredient__measurement_unit"]})\n'
         )
-    response = HttpResponse(
-        response_content,
-        content_type='text/plain'
+
+
+def shopping_list_csv(ingredients):
+    writer = csv.writer(Echo())
+    yield writer.writerow(('Ингредиент', 'Количество', 'Единица измерения'))
+    for item in ingredients:
+        yield writer.writerow((
+            item['ingredient__name'],
+            item['total_amount'],
+            item['ingredient__measurement_unit'],
+        ))
+
+
+def shopping_list_json(ingredients):
+    separator = ''
+    yield '['
+    for item in ingredients:
+        yield separator + json.dumps({
+            'name': item['ingredient__name'],
+            'amount': item['total_amount'],
+            'measurement_unit': item['ingredient__measurement_unit'],
+        }, ensure_ascii=False)
+        separator = ',\n'
+    yield ']\n'
+
+
+SHOPPING_LIST_FORMATS = {
+    'txt': (shopping_list_txt, 'text/plain'),
+    'csv': (shopping_list_csv, 'text/csv'),
+    'json': (shopping_list_json, 'application/json'),
+}
+
+
+def download_shopping_list(ingredients, file_format='txt'):
+    """Потоковая выгрузка списка покупок в выбранном формате.
+
+    Строки читаются из базы через iterator() и сразу уходят клиенту,
+    так что память не растёт с размером списка.
+    """
+    generator, content_type = SHOPPING_LIST_FORMATS[file_format]
+    response = StreamingHttpResponse(
+        generator(ingredients.iterator()),
+        content_type=f'{content_type}; charset=utf-8',
     )
     response['Content-Disposition'] = (
-        'attachment; filename="shopping_cart.txt"'
+        f'attachment; filename="shopping_cart.{file_format}"'
     )
     return response
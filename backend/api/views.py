@@ -1,19 +1,31 @@
-import uuid
+from collections import Counter
 
-from django.db.models import Sum
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Prefetch, Value
+from django.http import Http404
 from django.shortcuts import get_object_or_404, redirect
 from django.urls import reverse
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
 from rest_framework import status, viewsets
 from rest_framework.decorators import action, api_view, permission_classes
-from rest_framework.permissions import (SAFE_METHODS, AllowAny,
+from rest_framework.parsers import JSONParser
+from rest_framework.permissions import (SAFE_METHODS, AllowAny, IsAdminUser,
                                         IsAuthenticated,
                                         IsAuthenticatedOrReadOnly)
 from rest_framework.response import Response
 
-from api.filters import IngredientSearchFilter, RecipeFilter
-from api.paginators import FoodgramPagination
+from api.cache import CATALOG, COUNTERS, RECIPES, get_stats
+from api.catalog import ingredients_snapshot, tags_snapshot
+from api.constant import MAX_BULK_RECIPES, MAX_COOKING_INGREDIENTS
+from api.cooking_index import rank_recipes
+from api.filters import COUNTER_ORDERINGS, IngredientSearchFilter, RecipeFilter
+from api.ingredients_index import ingredients_index
+from api.mixins import (AnonymousCacheMixin, CatalogSnapshotMixin,
+                        ConditionalGetMixin)
+from api.paginators import FoodgramPagination, RecipePagination
+from api.parsers import NDJSONParser
 from api.permissions import IsAuthorOrReadOnly
 from api.serializers import (FavoriteAndShoppingCartSerializer,
                              FavoriteSerializer, FollowSerializer,
@@ -21,19 +33,57 @@ from api.serializers import (FavoriteAndShoppingCartSerializer,
                              RecipeSerializerGET, RecipeSerializerPOST,
                              ShoppingListSerializer, TagsSerializer,
                              UserAvatar, UserFoodgramSerializer)
-from api.utils import dowload_shoppig_list
-from recipes.models import Ingredient, IngredientsRecipe, Recipe, Tag
+from api.short_links import encode_short_link, get_recipe_pk
+from api.utils import (SHOPPING_LIST_FORMATS, download_shopping_list,
+                       get_bulk_context, get_ids, get_recipes_by_author,
+                       get_recipes_limit)
+from recipes.models import (Favorite, Ingredient, IngredientsRecipe, Recipe,
+                            ShoppingCartIngredient, ShoppingList, Tag)
 from user.models import Follow, User
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(ConditionalGetMixin, AnonymousCacheMixin,
+                    viewsets.ModelViewSet):
     """Представление Рецептов."""
 
     queryset = Recipe.objects.all()
-    pagination_class = FoodgramPagination
+    pagination_class = RecipePagination
     permission_classes = (IsAuthorOrReadOnly, IsAuthenticatedOrReadOnly,)
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
+    etag_generation = RECIPES
+    user_dependent = True
+    public_max_age = settings.RECIPES_MAX_AGE
+    response_cache_generation = RECIPES
+    response_cache_timeout = settings.RECIPES_CACHE_TIMEOUT
+
+    def get_queryset(self):
+        """Рецепты вместе с авторами, тегами и ингредиентами.
+
+        Флаги избранного и списка покупок считаются в самом запросе.
+        """
+        user = self.request.user
+        queryset = super().get_queryset().select_related(
+            'author'
+        ).prefetch_related(
+            'tags',
+            Prefetch(
+                'recipe_ingredients',
+                queryset=IngredientsRecipe.objects.select_related(
+                    'ingredient'),
+            ),
+        )
+        if not user.is_authenticated:
+            return queryset.annotate(
+                is_favorited=Value(False),
+                is_in_shopping_cart=Value(False),
+            )
+        return queryset.annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                author=user, recipe=OuterRef('pk'))),
+            is_in_shopping_cart=Exists(ShoppingList.objects.filter(
+                author=user, recipe=OuterRef('pk'))),
+        )
 
     def get_serializer_class(self):
         """Выбор сериализатора в зависимости от запроса."""
@@ -41,6 +91,175 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return RecipeSerializerGET
         return RecipeSerializerPOST
 
+    def get_extra_generations(self, request):
+        """Порядок по счётчикам устаревает вместе с ними."""
+        ordering = request.query_params.get('ordering', '')
+        if any(
+            field.strip().lstrip('-') in COUNTER_ORDERINGS
+            for field in ordering.split(',')
+        ):
+            return (COUNTERS,)
+        return ()
+
+    @action(
+        methods=['POST'],
+        detail=False,
+        url_path='bulk',
+        url_name='bulk',
+        permission_classes=(IsAuthenticated,),
+        parser_classes=(JSONParser, NDJSONParser),
+    )
+    def bulk(self, request):
+        """Создание и обновление пачки рецептов одним запросом.
+
+        Принимает JSON-массив или NDJSON. Рецепт с id обновляется, если
+        принадлежит пользователю; нецелый id и id, повторяющийся
+        в пачке, получают 400. Теги и ингредиенты всей пачки
+        загружаются разом, записи идут в одной транзакции, а в ответе
+        для каждого рецепта свой статус.
+        """
+        items = request.data
+        if not isinstance(items, list) or not items:
+            return Response(
+                {'errors': 'Ожидается непустой список рецептов.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(items) > MAX_BULK_RECIPES:
+            return Response(
+                {'errors': f'Не больше {MAX_BULK_RECIPES} рецептов '
+                 'за один запрос.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        context = {**self.get_serializer_context(), **get_bulk_context(items)}
+        item_ids = [
+            next(iter(get_ids([item.get('id')])), None)
+            if isinstance(item, dict) else None
+            for item in items
+        ]
+        repeated_ids = {
+            pk for pk, count in Counter(item_ids).items()
+            if pk is not None and count > 1
+        }
+        recipes = Recipe.objects.in_bulk(
+            {pk for pk in item_ids if pk is not None})
+        results, created, updated = [], [], []
+        for index, item in enumerate(items):
+            if not isinstance(item, dict):
+                results.append({
+                    'index': index,
+                    'status': status.HTTP_400_BAD_REQUEST,
+                    'errors': 'Ожидается объект рецепта.',
+                })
+                continue
+            instance = None
+            if item_ids[index] in repeated_ids:
+                results.append({
+                    'index': index,
+                    'status': status.HTTP_400_BAD_REQUEST,
+                    'errors': 'Рецепт с таким id встречается в пачке '
+                              'несколько раз.',
+                })
+                continue
+            if item.get('id') is not None and item_ids[index] is None:
+                results.append({
+                    'index': index,
+                    'status': status.HTTP_400_BAD_REQUEST,
+                    'errors': 'Некорректный id рецепта.',
+                })
+                continue
+            if item.get('id') is not None:
+                instance = recipes.get(item_ids[index])
+                if instance is None:
+                    results.append({
+                        'index': index,
+                        'status': status.HTTP_404_NOT_FOUND,
+                        'errors': 'Рецепт не найден.',
+                    })
+                    continue
+                if instance.author_id != request.user.id:
+                    results.append({
+                        'index': index,
+                        'status': status.HTTP_403_FORBIDDEN,
+                        'errors': 'Можно изменять только свои рецепты.',
+                    })
+                    continue
+            serializer = RecipeSerializerPOST(
+                instance, data=item, context=context,
+                partial=instance is not None)
+            if not serializer.is_valid():
+                results.append({
+                    'index': index,
+                    'status': status.HTTP_400_BAD_REQUEST,
+                    'errors': serializer.errors,
+                })
+                continue
+            result = {'index': index}
+            (updated if instance else created).append((serializer, result))
+            results.append(result)
+        with transaction.atomic():
+            for serializer, result in updated:
+                result.update(
+                    id=serializer.save().id, status=status.HTTP_200_OK)
+            new_recipes = RecipeSerializerPOST.create_many(
+                [serializer for serializer, _ in created], request.user)
+            for recipe, (_, result) in zip(new_recipes, created):
+                result.update(id=recipe.id, status=status.HTTP_201_CREATED)
+        saved = len(created) + len(updated)
+        if saved == len(items):
+            response_status = (
+                status.HTTP_201_CREATED if created else status.HTTP_200_OK)
+        elif saved:
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_400_BAD_REQUEST
+        return Response(results, status=response_status)
+
+    @action(
+        methods=['GET'],
+        detail=False,
+        url_path='what_to_cook',
+        url_name='what_to_cook',
+        pagination_class=FoodgramPagination,
+    )
+    def what_to_cook(self, request):
+        """Рецепты из имеющихся ингредиентов.
+
+        Ингредиенты передаются параметром ingredients (через запятую
+        или повтором). Сначала идут рецепты, для которых есть наибольшая
+        доля ингредиентов; считается по обратному индексу
+        IngredientRecipeIndex без GROUP BY по всем рецептам.
+        """
+        ingredient_ids = get_ids(
+            value
+            for values in request.query_params.getlist('ingredients')
+            for value in values.split(',')
+        )
+        if not ingredient_ids:
+            return Response(
+                {'ingredients': 'Укажите id хотя бы одного ингредиента.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(ingredient_ids) > MAX_COOKING_INGREDIENTS:
+            return Response(
+                {'ingredients': f'Не больше {MAX_COOKING_INGREDIENTS} '
+                 'ингредиентов.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        page = self.paginate_queryset(rank_recipes(ingredient_ids))
+        recipes = self.get_queryset().in_bulk(
+            [recipe_id for recipe_id, _, _ in page])
+        page = [item for item in page if item[0] in recipes]
+        serializer = self.get_serializer(
+            [recipes[recipe_id] for recipe_id, _, _ in page], many=True)
+        return self.get_paginated_response([
+            {
+                **data,
+                'matched_ingredients': matched,
+                'missing_ingredients': total - matched,
+            }
+            for data, (_, matched, total) in zip(serializer.data, page)
+        ])
+
     @action(
         methods=['GET'],
         detail=True,
@@ -50,21 +269,11 @@ class RecipeViewSet(viewsets.ModelViewSet):
     def get_short_link(self, request, pk=None):
         """Получение короткой ссылки."""
         recipe = self.get_object()
-        if not recipe.short_link:
-            recipe.short_link = self.generate_link()
-            recipe.save()
+        short_link = recipe.short_link or encode_short_link(recipe.pk)
         full_url = request.build_absolute_uri(
-            reverse('short-link', args=[recipe.short_link]))
+            reverse('short-link', args=[short_link]))
         return Response({'short-link': full_url}, status=status.HTTP_200_OK)
 
-    def generate_link(self):
-        """Функция для получения короткой ссылки
-        и проверки на оригинальность."""
-        short_link = uuid.uuid4().hex[:3]
-        while Recipe.objects.filter(short_link=short_link).exists():
-            short_link = uuid.uuid4().hex[:3]
-        return short_link
-
     @action(
         methods=['POST', 'DELETE'],
         detail=True,
@@ -123,32 +332,59 @@ class RecipeViewSet(viewsets.ModelViewSet):
     def preparing_shopping_list(self, request):
         """Подготовка к скачиванию списка покупок."""
         ingredients = (
-            IngredientsRecipe.objects
-            .filter(recipe__shopping_lists__author=request.user)
-            .values('ingredient__name', 'ingredient__measurement_unit')
-            .annotate(total_amount=Sum('amount'))
+            ShoppingCartIngredient.objects
+            .filter(author=request.user, total_amount__gt=0)
+            .values(
+                'ingredient__name',
+                'ingredient__measurement_unit',
+                'total_amount',
+            )
+            .order_by('ingredient__name')
         )
-        return dowload_shoppig_list(self, request, ingredients)
+        file_format = request.query_params.get('file_format', 'txt')
+        if file_format not in SHOPPING_LIST_FORMATS:
+            return Response(
+                {'file_format': 'Доступные форматы: '
+                 + ', '.join(SHOPPING_LIST_FORMATS)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return download_shopping_list(ingredients, file_format)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def cache_stats(request):
+    """Попадания и промахи кэша ответов для мониторинга."""
+    return Response(get_stats(RECIPES))
 
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def short_link(request, short_link):
-    """Представление Короткой ссылки"""
-    recipe = get_object_or_404(Recipe, short_link=short_link)
-    return redirect('recipes-detail', pk=recipe.pk)
+    """Представление Короткой ссылки.
+
+    Перенаправляет без запроса к базе: если рецепта с таким id нет,
+    404 вернёт страница рецепта.
+    """
+    pk = get_recipe_pk(short_link)
+    if pk is None:
+        raise Http404
+    return redirect('recipes-detail', pk=pk)
 
 
-class TagsViewSet(viewsets.ModelViewSet):
+class TagsViewSet(CatalogSnapshotMixin, viewsets.ModelViewSet):
     """Представление тегов."""
 
     queryset = Tag.objects.all()
     serializer_class = TagsSerializer
     http_method_names = ('get',)
     permission_classes = (AllowAny,)
+    etag_generation = CATALOG
+    public_max_age = settings.CATALOG_MAX_AGE
+    catalog_snapshot = tags_snapshot
 
 
-class IngredientsViewSet(viewsets.ModelViewSet):
+class IngredientsViewSet(CatalogSnapshotMixin, viewsets.ModelViewSet):
     """Представление ингредиентов."""
 
     queryset = Ingredient.objects.all()
@@ -158,6 +394,16 @@ class IngredientsViewSet(viewsets.ModelViewSet):
     filterset_class = IngredientSearchFilter
     search_fields = ('$name',)
     permission_classes = (AllowAny,)
+    etag_generation = CATALOG
+    public_max_age = settings.CATALOG_MAX_AGE
+    catalog_snapshot = ingredients_snapshot
+
+    def filter_queryset(self, queryset):
+        """Поиск по началу названия отвечает из индекса в памяти."""
+        name = self.request.query_params.get('name')
+        if self.action == 'list' and name:
+            return ingredients_index.search(name)
+        return super().filter_queryset(queryset)
 
 
 class UserViewSet(UserViewSet):
@@ -214,10 +460,20 @@ class UserViewSet(UserViewSet):
     )
     def get_following_me(self, request):
         """Получение списка подписок рецептов пользователя."""
-        authors = Follow.objects.filter(subscriber=self.request.user)
-        paginator = self.paginate_queryset(authors)
-        serializer = FollowSerializer(
-            paginator, context={'request': request}, many=True
+        authors = User.objects.filter(
+            author__subscriber=request.user
+        ).order_by('author__id')
+        page = self.paginate_queryset(authors)
+        recipes_by_author = get_recipes_by_author(
+            [author.id for author in page], get_recipes_limit(request)
+        )
+        serializer = FollowShowSerializer(
+            page,
+            context={
+                'request': request,
+                'recipes_by_author': recipes_by_author,
+            },
+            many=True,
         )
         return self.get_paginated_response(serializer.data)
 
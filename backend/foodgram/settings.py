@@ -80,6 +80,77 @@ else:
     }
 
 
+# Ответы, фрагменты рецептов и COUNT(*) лежат в 'default', счётчики
+# поколений, по которым они сбрасываются, — в 'generations'.
+# LocMemCache по умолчанию годится только для разработки: у каждого
+# процесса свой кэш, и сброс поколения из другого воркера или из
+# команды manage.py (import_*, build_catalog, reconcile_counters,
+# rebuild_*) до сервера не дойдёт, пока не истечёт время жизни записей.
+# В продакшене нужен общий кэш, например memcached (так настроен
+# infra/docker-compose.yml):
+# CACHE_BACKEND=django.core.cache.backends.memcached.PyMemcacheCache,
+# CACHE_LOCATION=memcached:11211. Поколения лучше держать в отдельном
+# экземпляре (GENERATIONS_CACHE_LOCATION), чтобы их не вытесняли ответы.
+LOCMEM_CACHE = 'django.core.cache.backends.locmem.LocMemCache'
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', LOCMEM_CACHE)
+GENERATIONS_CACHE_BACKEND = os.getenv(
+    'GENERATIONS_CACHE_BACKEND', CACHE_BACKEND)
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': os.getenv('CACHE_LOCATION', 'foodgram'),
+    },
+    'generations': {
+        'BACKEND': GENERATIONS_CACHE_BACKEND,
+        'LOCATION': os.getenv(
+            'GENERATIONS_CACHE_LOCATION',
+            'foodgram-generations'
+            if GENERATIONS_CACHE_BACKEND == LOCMEM_CACHE
+            else os.getenv('CACHE_LOCATION', ''),
+        ),
+    },
+}
+if GENERATIONS_CACHE_BACKEND == LOCMEM_CACHE:
+    # Ключей поколений по одному на рецепт и пользователя,
+    # 300 по умолчанию мало.
+    CACHES['generations']['OPTIONS'] = {'MAX_ENTRIES': 100000}
+# Сколько секунд живёт счётчик поколения. В LocMemCache сброс из команды
+# manage.py до сервера не доходит, поэтому поколения истекают, и снимки
+# справочников, индекс ингредиентов, словарь тегов и ETag через это
+# время строятся заново. В общем кэше поколения бессрочны.
+GENERATIONS_TIMEOUT = (
+    int(os.environ['GENERATIONS_TIMEOUT'])
+    if os.getenv('GENERATIONS_TIMEOUT')
+    else 60 if GENERATIONS_CACHE_BACKEND == LOCMEM_CACHE else None
+)
+
+# Сколько секунд хранить COUNT(*) для постраничных списков.
+COUNT_CACHE_TIMEOUT = int(os.getenv('COUNT_CACHE_TIMEOUT', 30))
+# Сколько секунд хранить ответы списка и карточек рецептов для анонимов.
+RECIPES_CACHE_TIMEOUT = int(os.getenv('RECIPES_CACHE_TIMEOUT', 600))
+# Cache-Control: max-age для анонимных ответов (используется nginx).
+RECIPES_MAX_AGE = int(os.getenv('RECIPES_MAX_AGE', 30))
+CATALOG_MAX_AGE = int(os.getenv('CATALOG_MAX_AGE', 300))
+# Сколько секунд хранить общую для всех пользователей часть рецепта.
+RECIPE_FRAGMENT_TIMEOUT = int(os.getenv('RECIPE_FRAGMENT_TIMEOUT', 3600))
+# Для списков без фильтров на PostgreSQL брать оценку pg_class.reltuples,
+# если в таблице больше строк, чем этот порог. 0 — всегда точный COUNT.
+APPROXIMATE_COUNT_THRESHOLD = int(
+    os.getenv('APPROXIMATE_COUNT_THRESHOLD', 0))
+# Каталог, куда записываются tags.json и ingredients.json для раздачи
+# через nginx. Пустое значение — файлы не пишутся.
+CATALOG_SNAPSHOT_DIR = os.getenv('CATALOG_SNAPSHOT_DIR', '')
+# Потоков для построения уменьшенных копий картинок в каждом процессе.
+# 0 — строить сразу после фиксации транзакции в том же потоке.
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', 2))
+# Наибольший размер картинки после декодирования base64, в байтах.
+MAX_IMAGE_SIZE = int(os.getenv('MAX_IMAGE_SIZE', 5 * 1024 * 1024))
+# Тело JSON-запроса с картинкой в base64 примерно на треть больше
+# самой картинки; значение совпадает с client_max_body_size в nginx.
+DATA_UPLOAD_MAX_MEMORY_SIZE = int(
+    os.getenv('DATA_UPLOAD_MAX_MEMORY_SIZE', 10 * 1024 * 1024))
+
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
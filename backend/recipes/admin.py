@@ -1,13 +1,35 @@
 from django.contrib import admin
+from django.db import transaction
 
+from api.catalog import rebuild_catalog
+from api.cooking_index import schedule_cooking_index_update
 from recipes.models import (Favorite, Ingredient, IngredientsRecipe, Recipe,
-                            ShoppingList, Tag, TagsRecipe)
+                            ShoppingCartIngredient, ShoppingList, Tag,
+                            TagsRecipe)
+from recipes.services import (get_amounts_delta, get_cart_author_ids,
+                              get_recipe_amounts, update_shopping_cart_totals)
 
 admin.site.empty_value_display = "-пусто-"
 
 
+class CatalogAdmin(admin.ModelAdmin):
+    """Пересобирает снимки справочника после правок в админке."""
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        transaction.on_commit(rebuild_catalog)
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        transaction.on_commit(rebuild_catalog)
+
+    def delete_queryset(self, request, queryset):
+        super().delete_queryset(request, queryset)
+        transaction.on_commit(rebuild_catalog)
+
+
 @admin.register(Tag)
-class TagAdmin(admin.ModelAdmin):
+class TagAdmin(CatalogAdmin):
     """Класс настройки раздела Тэгов."""
 
     list_display = ('id', 'name', 'slug')
@@ -16,7 +38,7 @@ class TagAdmin(admin.ModelAdmin):
 
 
 @admin.register(Ingredient)
-class IngredientsAdmin(admin.ModelAdmin):
+class IngredientsAdmin(CatalogAdmin):
     """Класс настройки раздела Ингредиенты."""
 
     list_display = ('id', 'name', 'measurement_unit')
@@ -44,6 +66,20 @@ class RecipeAdmin(admin.ModelAdmin):
     list_editable = ('author',)
     search_fields = ('subscriber__username', 'subscriber__email')
 
+    def save_related(self, request, form, formsets, change):
+        """Обновляет индекс рецептов по ингредиентам и итоги списков
+        покупок после правки ингредиентов."""
+        recipe = form.instance
+        old_amounts = get_recipe_amounts(recipe)
+        super().save_related(request, form, formsets, change)
+        new_amounts = get_recipe_amounts(recipe)
+        schedule_cooking_index_update(
+            [recipe.pk], old_amounts.keys() | new_amounts)
+        update_shopping_cart_totals(
+            get_cart_author_ids(recipe),
+            get_amounts_delta(old_amounts, new_amounts),
+        )
+
 
 @admin.register(IngredientsRecipe)
 class IngredientsRecipeAdmin(admin.ModelAdmin):
@@ -76,6 +112,14 @@ class ShoppingListAdmin(admin.ModelAdmin):
     search_fields = ('shopping_lists__author',)
 
 
+@admin.register(ShoppingCartIngredient)
+class ShoppingCartIngredientAdmin(admin.ModelAdmin):
+    """Класс настройки раздела итогов списка покупок."""
+
+    list_display = ('id', 'author', 'ingredient', 'total_amount')
+    list_filter = ('author',)
+
+
 @admin.register(TagsRecipe)
 class TagsRecipetAdmin(admin.ModelAdmin):
     """Класс настройки раздела тэгов."""
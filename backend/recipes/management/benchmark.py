@@ -0,0 +1,119 @@
+import random
+import statistics
+import time
+
+from django.db import connection
+
+from api.utils import batched
+from recipes.models import Favorite, Ingredient, Recipe, Tag, TagsRecipe
+from user.models import Follow, User
+
+BATCH_SIZE = 10000
+BENCHMARK_TAGS = 10
+BENCHMARK_INGREDIENTS = 2000
+FOLLOWS_PER_USER = 10
+FAVORITE_EVERY = 20
+
+
+def bulk_insert(model, objects, log=None):
+    total = 0
+    for batch in batched(objects, BATCH_SIZE):
+        model.objects.bulk_create(batch)
+        total += len(batch)
+        if log:
+            log(f'{model._meta.verbose_name_plural}: {total}')
+    return total
+
+
+def seed_benchmark_data(recipes_total, users_total, log=None):
+    """Наполняет базу синтетическими данными для замеров.
+
+    Рассчитано на вызов внутри transaction.atomic() с последующим
+    откатом: данные не чистятся.
+    """
+    random.seed(recipes_total)
+    bulk_insert(User, (
+        User(
+            username=f'bench_{number}',
+            email=f'bench_{number}@bench.local',
+            first_name='Bench',
+            last_name='User',
+            password='!',
+        )
+        for number in range(users_total)
+    ), log)
+    user_ids = list(User.objects.filter(
+        username__startswith='bench_').values_list('id', flat=True))
+    bulk_insert(Tag, (
+        Tag(name=f'Бенчмарк {number}', slug=f'bench-{number}')
+        for number in range(BENCHMARK_TAGS)
+    ))
+    tag_ids = list(Tag.objects.filter(
+        slug__startswith='bench-').values_list('id', flat=True))
+    bulk_insert(Ingredient, (
+        Ingredient(name=f'бенчмарк {number}', measurement_unit='г')
+        for number in range(BENCHMARK_INGREDIENTS)
+    ))
+    bulk_insert(Recipe, (
+        Recipe(
+            author_id=random.choice(user_ids),
+            name=f'Бенчмарк {number}',
+            image='recipes/images/bench.png',
+            text='Синтетический рецепт для замеров.',
+            cooking_time=random.randint(1, 120),
+        )
+        for number in range(recipes_total)
+    ), log)
+    recipe_ids = Recipe.objects.filter(
+        name__startswith='Бенчмарк ').values_list('id', flat=True)
+    bulk_insert(TagsRecipe, (
+        TagsRecipe(name_id=tag_id, recipe_id=recipe_id)
+        for recipe_id in recipe_ids.iterator()
+        for tag_id in random.sample(tag_ids, random.randint(1, 3))
+    ), log)
+    bulk_insert(Favorite, (
+        Favorite(author_id=random.choice(user_ids), recipe_id=recipe_id)
+        for recipe_id in recipe_ids.iterator()
+        if recipe_id % FAVORITE_EVERY == 0
+    ), log)
+    bulk_insert(Follow, (
+        Follow(subscriber_id=subscriber_id, author_id=author_id)
+        for subscriber_id in user_ids
+        for author_id in random.sample(
+            user_ids, min(FOLLOWS_PER_USER, len(user_ids)))
+        if author_id != subscriber_id
+    ), log)
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+    return user_ids
+
+
+def drop_indexes(names):
+    with connection.cursor() as cursor:
+        for name in names:
+            cursor.execute(
+                f'DROP INDEX IF EXISTS {connection.ops.quote_name(name)}')
+        cursor.execute('ANALYZE')
+
+
+def explain(queryset):
+    if connection.vendor == 'postgresql':
+        return queryset.explain(analyze=True, buffers=True)
+    return queryset.explain()
+
+
+def measure(queryset, repeats=3):
+    """Медианное время выполнения запроса в миллисекундах."""
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        list(queryset.all())
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def report(stdout, title, queries):
+    stdout.write(f'===== {title} =====')
+    for name, queryset in queries.items():
+        stdout.write(f'--- {name}: {measure(queryset):.2f} мс')
+        stdout.write(explain(queryset))
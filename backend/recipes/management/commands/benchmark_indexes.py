@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from recipes.management.benchmark import (drop_indexes, report,
+                                          seed_benchmark_data)
+from recipes.models import Ingredient, Recipe
+from user.models import Follow
+
+FEED_INDEXES = (
+    'recipe_pub_date_idx',
+    'recipe_author_pub_date_idx',
+    'tags_recipe_name_recipe_idx',
+)
+POSTGRESQL_INDEXES = ('ingredient_name_upper_idx',)
+PAGE_SIZE = 6
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнение планов горячих запросов с индексами и без них '
+        'на синтетических данных. Все изменения откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=1_000_000)
+        parser.add_argument('--users', type=int, default=10_000)
+
+    def get_queries(self, user_id):
+        return {
+            'Лента рецептов': Recipe.objects.all()[:PAGE_SIZE],
+            'Рецепты автора': Recipe.objects.filter(
+                author_id=user_id)[:PAGE_SIZE],
+            'Фильтр по тегу': Recipe.objects.filter(
+                tags__slug='bench-1')[:PAGE_SIZE],
+            'Избранное': Recipe.objects.filter(
+                favorites__author_id=user_id)[:PAGE_SIZE],
+            'Подписки': Follow.objects.filter(
+                subscriber_id=user_id).order_by('id')[:PAGE_SIZE],
+            'Поиск ингредиента': Ingredient.objects.filter(
+                name__istartswith='бенчмарк 12')[:PAGE_SIZE],
+        }
+
+    def handle(self, *args, **options):
+        indexes = FEED_INDEXES
+        if connection.vendor == 'postgresql':
+            indexes += POSTGRESQL_INDEXES
+        with transaction.atomic():
+            user_ids = seed_benchmark_data(
+                options['recipes'], options['users'],
+                log=lambda message: self.stderr.write(message),
+            )
+            queries = self.get_queries(user_ids[0])
+            report(self.stdout, 'С индексами', queries)
+            drop_indexes(indexes)
+            report(self.stdout, 'Без индексов', queries)
+            transaction.set_rollback(True)
@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+
+from recipes.management.benchmark import report, seed_benchmark_data
+from recipes.models import Recipe, Tag, TagsRecipe
+
+BENCHMARK_SLUGS = ('bench-1', 'bench-2', 'bench-3')
+PAGE_SIZE = 6
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнение старого (JOIN и DISTINCT) и нового (EXISTS) фильтра '
+        'рецептов по нескольким тегам на синтетических данных. '
+        'Все изменения откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=100_000)
+        parser.add_argument('--users', type=int, default=1_000)
+
+    def get_joined(self):
+        """Прежний фильтр: JOIN по tags__slug."""
+        return Recipe.objects.filter(tags__slug__in=BENCHMARK_SLUGS)
+
+    def get_exists(self):
+        """Новый фильтр: EXISTS по TagsRecipe с id тегов."""
+        tag_ids = list(Tag.objects.filter(
+            slug__in=BENCHMARK_SLUGS).values_list('id', flat=True))
+        return Recipe.objects.filter(Exists(TagsRecipe.objects.filter(
+            recipe=OuterRef('pk'), name_id__in=tag_ids)))
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            seed_benchmark_data(
+                options['recipes'], options['users'],
+                log=lambda message: self.stderr.write(message),
+            )
+            joined, exists = self.get_joined(), self.get_exists()
+            report(self.stdout, 'Старый фильтр', {
+                'Варианты AllValuesMultipleFilter': Recipe.objects.distinct()
+                .order_by('tags__slug').values_list('tags__slug', flat=True),
+                'Страница (JOIN)': joined[:PAGE_SIZE],
+                'Страница (JOIN, DISTINCT)': joined.distinct()[:PAGE_SIZE],
+                'Id рецептов (JOIN, DISTINCT)': joined.distinct()
+                .order_by().values('pk'),
+            })
+            report(self.stdout, 'Новый фильтр', {
+                'Страница (EXISTS)': exists[:PAGE_SIZE],
+                'Id рецептов (EXISTS)': exists.order_by().values('pk'),
+            })
+            self.stdout.write(
+                f'Строк с JOIN: {joined.count()}, '
+                f'уникальных рецептов: {joined.distinct().count()}, '
+                f'с EXISTS: {exists.count()}'
+            )
+            transaction.set_rollback(True)
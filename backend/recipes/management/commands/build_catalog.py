@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.catalog import rebuild_catalog
+
+
+class Command(BaseCommand):
+    help = 'Пересборка снимков тегов и ингредиентов'
+
+    def handle(self, *args, **options):
+        rebuild_catalog()
+        if settings.CATALOG_SNAPSHOT_DIR:
+            self.stdout.write(self.style.SUCCESS(
+                f'Снимки записаны в {settings.CATALOG_SNAPSHOT_DIR}.'
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                'Снимки в памяти сброшены, CATALOG_SNAPSHOT_DIR не задан.'
+            ))
@@ -1,34 +1,59 @@
-import csv
-
 from django.core.management.base import BaseCommand
 from tqdm import tqdm
 
+from api.cache import RECIPES, bump_generation
+from api.catalog import rebuild_catalog
+from api.utils import batched
 from foodgram.settings import CSV_FILE_INGREDIENTS
+from recipes.management.importing import add_import_arguments, read_rows
 from recipes.models import Ingredient
 
 
 class Command(BaseCommand):
-    help = 'Импорт ингредиентов из CSV файлов'
+    help = 'Импорт ингредиентов из CSV или JSON файла'
+
+    def add_arguments(self, parser):
+        add_import_arguments(parser, CSV_FILE_INGREDIENTS)
+
+    def report_row(self, number, row):
+        self.stderr.write(self.style.WARNING(
+            f'Строка {number} пропущена: {row!r}'))
 
-    def handle(self, *args, **kwargs):
-        Ingredient.objects.all().delete()
+    def handle(self, *args, **options):
+        rows = read_rows(
+            options['path'], ('name', 'measurement_unit'),
+            on_error=self.report_row,
+        )
+        total = created = 0
+        for batch in batched(
+            tqdm(rows, desc='Импорт ингредиентов'), options['batch_size']
+        ):
+            batch = list(dict.fromkeys(batch))
+            existing = set(Ingredient.objects.filter(
+                name__in={name for name, _ in batch}
+            ).values_list('name', 'measurement_unit'))
+            new_rows = [row for row in batch if row not in existing]
+            total += len(batch)
+            created += len(new_rows)
+            if options['dry_run']:
+                for name, measurement_unit in new_rows:
+                    self.stdout.write(f'+ {name} ({measurement_unit})')
+                continue
+            Ingredient.objects.bulk_create(
+                (
+                    Ingredient(name=name, measurement_unit=measurement_unit)
+                    for name, measurement_unit in new_rows
+                ),
+                ignore_conflicts=True,
+            )
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(
+                f'Строк в файле: {total}, будет добавлено: {created}.'
+            ))
+            return
+        if created:
+            bump_generation(RECIPES)
+        rebuild_catalog()
         self.stdout.write(self.style.SUCCESS(
-            'Все существующие ингредиенты удалены.'
+            f'Строк в файле: {total}, добавлено ингредиентов: {created}.'
         ))
-        with open(CSV_FILE_INGREDIENTS,
-                  'r',
-                  encoding='utf-8') as csvfile:
-            reader = csv.reader(csvfile)
-            rows = list(reader)
-            total_rows = len(rows)
-            for row in tqdm(
-                rows, total=total_rows, desc='Импорт ингредиентов'
-            ):
-                ingredients, created = Ingredient.objects.get_or_create(
-                    name=row[0],
-                    measurement_unit=row[1],
-                )
-                if created:
-                    self.stdout.write(self.style.SUCCESS(
-                        f'Ингредиент {ingredients.name} успешно импортирован.'
-                    ))
@@ -1,32 +1,62 @@
-import csv
-
 from django.core.management.base import BaseCommand
 from tqdm import tqdm
 
+from api.cache import RECIPES, bump_generation
+from api.catalog import rebuild_catalog
+from api.utils import batched
 from foodgram.settings import CSV_FILE_TAGS
+from recipes.management.importing import add_import_arguments, read_rows
 from recipes.models import Tag
 
 
 class Command(BaseCommand):
-    help = 'Импорт тэгов из CSV файлов'
+    help = 'Импорт тэгов из CSV или JSON файла'
+
+    def add_arguments(self, parser):
+        add_import_arguments(parser, CSV_FILE_TAGS)
+
+    def report_row(self, number, row):
+        self.stderr.write(self.style.WARNING(
+            f'Строка {number} пропущена: {row!r}'))
 
-    def handle(self, *args, **kwargs):
-        Tag.objects.all().delete()
+    def handle(self, *args, **options):
+        rows = read_rows(
+            options['path'], ('name', 'slug'), on_error=self.report_row)
+        total = created = updated = 0
+        for batch in batched(
+            tqdm(rows, desc='Импорт Тэгов'), options['batch_size']
+        ):
+            names = {slug: name for name, slug in batch}
+            existing = Tag.objects.in_bulk(names, field_name='slug')
+            new_tags, changed_tags = [], []
+            for slug, name in names.items():
+                tag = existing.get(slug)
+                if tag is None:
+                    new_tags.append(Tag(name=name, slug=slug))
+                elif tag.name != name:
+                    if options['dry_run']:
+                        self.stdout.write(f'~ {slug}: {tag.name} -> {name}')
+                    tag.name = name
+                    changed_tags.append(tag)
+            total += len(names)
+            created += len(new_tags)
+            updated += len(changed_tags)
+            if options['dry_run']:
+                for tag in new_tags:
+                    self.stdout.write(f'+ {tag.slug}: {tag.name}')
+                continue
+            Tag.objects.bulk_create(new_tags, ignore_conflicts=True)
+            Tag.objects.bulk_update(changed_tags, ('name',))
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(
+                f'Тэгов в файле: {total}, будет добавлено: {created}, '
+                f'изменено: {updated}.'
+            ))
+            return
+        if created or updated:
+            bump_generation(RECIPES)
+        rebuild_catalog()
         self.stdout.write(self.style.SUCCESS(
-            'Все существующие ингредиенты удалены.'
+            f'Тэгов в файле: {total}, добавлено: {created}, '
+            f'изменено: {updated}.'
         ))
-        with open(CSV_FILE_TAGS,
-                  'r',
-                  encoding='utf-8') as csvfile:
-            reader = csv.reader(csvfile)
-            rows = list(reader)
-            total_rows = len(rows)
-            for row in tqdm(rows, total=total_rows, desc='Импорт Тэгов'):
-                tags, created = Tag.objects.get_or_create(
-                    name=row[0],
-                    slug=row[1],
-                )
-                if created:
-                    self.stdout.write(self.style.SUCCESS(
-                        f'Тэг {tags.name} успешно импортирован.'
-                    ))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from api.images import RENDITIONS, get_stale_renditions, process_renditions
+
+
+class Command(BaseCommand):
+    help = 'Построение уменьшенных копий картинок рецептов и аватаров'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Перестроить все копии, даже уже готовые.',
+        )
+
+    def handle(self, *args, **options):
+        for model, (_, renditions) in RENDITIONS.items():
+            fields = {'pk'}
+            for source_field, rendition_field, _, _ in renditions:
+                fields |= {source_field, rendition_field}
+            processed = 0
+            for instance in model.objects.only(*fields).iterator():
+                if options['force'] or get_stale_renditions(instance):
+                    process_renditions(
+                        model, instance.pk, force=options['force'])
+                    processed += 1
+            self.stdout.write(self.style.SUCCESS(
+                f'{model._meta.verbose_name_plural}: '
+                f'обработано {processed}.'
+            ))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from api.cooking_index import rebuild_cooking_index
+
+
+class Command(BaseCommand):
+    help = 'Пересборка индекса рецептов по ингредиентам'
+
+    def handle(self, *args, **options):
+        rebuild_cooking_index()
+        self.stdout.write(self.style.SUCCESS(
+            'Индекс рецептов по ингредиентам пересобран.'))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from api.search import get_search_backend, rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = 'Пересборка полнотекстового индекса рецептов'
+
+    def handle(self, *args, **options):
+        if get_search_backend() is None:
+            self.stdout.write(self.style.WARNING(
+                'Полнотекстовый поиск недоступен для этой базы.'
+            ))
+            return
+        rebuild_search_index()
+        self.stdout.write(self.style.SUCCESS('Поисковый индекс пересобран.'))
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.services import (check_shopping_cart_totals,
+                              rebuild_shopping_cart_totals)
+
+
+class Command(BaseCommand):
+    help = 'Пересборка и проверка итогов списков покупок'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только проверить итоги, ничего не меняя.',
+        )
+
+    def handle(self, *args, **options):
+        if not options['check']:
+            rebuild_shopping_cart_totals()
+            self.stdout.write(self.style.SUCCESS(
+                'Итоги списков покупок пересобраны.'
+            ))
+            return
+        mismatches = check_shopping_cart_totals()
+        for author_id, ingredient_id, expected, stored in mismatches:
+            self.stdout.write(
+                f'Пользователь {author_id}, ингредиент {ingredient_id}: '
+                f'ожидается {expected}, сохранено {stored}'
+            )
+        if mismatches:
+            raise CommandError(
+                f'Найдено расхождений: {len(mismatches)}. '
+                'Запустите команду без --check для пересборки.'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            'Итоги списков покупок согласованы.'
+        ))
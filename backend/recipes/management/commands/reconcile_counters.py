@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.services import check_counters, reconcile_counters
+
+
+class Command(BaseCommand):
+    help = 'Пересчёт и проверка счётчиков избранного, покупок и подписок'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только проверить счётчики, ничего не меняя.',
+        )
+
+    def handle(self, *args, **options):
+        if not options['check']:
+            reconcile_counters()
+            self.stdout.write(self.style.SUCCESS('Счётчики пересчитаны.'))
+            return
+        mismatches = check_counters()
+        for model_name, pk, field, expected, stored in mismatches:
+            self.stdout.write(
+                f'{model_name} {pk}, {field}: '
+                f'ожидается {expected}, сохранено {stored}'
+            )
+        if mismatches:
+            raise CommandError(
+                f'Найдено расхождений: {len(mismatches)}. '
+                'Запустите команду без --check для пересчёта.'
+            )
+        self.stdout.write(self.style.SUCCESS('Счётчики согласованы.'))
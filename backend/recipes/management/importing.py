@@ -0,0 +1,91 @@
+import csv
+import json
+
+IMPORT_BATCH_SIZE = 500
+JSON_CHUNK_SIZE = 64 * 1024
+
+
+def add_import_arguments(parser, default_path):
+    parser.add_argument(
+        '--path',
+        default=default_path,
+        help='Файл CSV или JSON для импорта.',
+    )
+    parser.add_argument(
+        '--batch-size',
+        type=int,
+        default=IMPORT_BATCH_SIZE,
+        help='Сколько строк записывать одним запросом.',
+    )
+    parser.add_argument(
+        '--dry-run',
+        action='store_true',
+        help='Только показать, что будет добавлено и изменено.',
+    )
+
+
+def iter_json_array(file, chunk_size=JSON_CHUNK_SIZE):
+    """Элементы JSON-массива по одному, файл читается частями."""
+    decoder = json.JSONDecoder()
+    buffer = file.read(chunk_size).lstrip()
+    if not buffer.startswith('['):
+        raise ValueError('Ожидается JSON-массив.')
+    buffer = buffer[1:]
+    eof = False
+    while True:
+        buffer = buffer.lstrip().lstrip(',').lstrip()
+        if buffer.startswith(']'):
+            return
+        try:
+            item, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            chunk = file.read(chunk_size)
+            eof = not chunk
+            buffer += chunk
+            continue
+        yield item
+        buffer = buffer[end:]
+
+
+def clean_row(values, size):
+    """Кортеж из size непустых строк без пробелов по краям или None."""
+    if len(values) < size:
+        return None
+    values = values[:size]
+    if not all(isinstance(value, str) and value.strip() for value in values):
+        return None
+    return tuple(value.strip() for value in values)
+
+
+def read_rows(path, fields, on_error=None):
+    """Строки файла CSV или JSON в виде кортежей значений fields.
+
+    Файл не читается целиком, так что память не зависит от его размера.
+    Строки, где не хватает полей или они пустые, пропускаются,
+    и для каждой вызывается on_error(номер строки, строка).
+    """
+    with open(path, encoding='utf-8') as file:
+        if path.endswith('.json'):
+            items = (
+                (
+                    number,
+                    item,
+                    [item.get(field) for field in fields]
+                    if isinstance(item, dict) else [],
+                )
+                for number, item in enumerate(iter_json_array(file), 1)
+            )
+        else:
+            items = (
+                (number, row, row)
+                for number, row in enumerate(csv.reader(file), 1)
+                if row
+            )
+        for number, item, values in items:
+            row = clean_row(values, len(fields))
+            if row is not None:
+                yield row
+            elif on_error is not None:
+                on_error(number, item)
@@ -0,0 +1,23 @@
+# Generated by Django 3.2.3 on 2026-10-18 04:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0004_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='image_large',
+            field=models.ImageField(blank=True, editable=False, upload_to='recipes/renditions/', verbose_name='Большая картинка'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='image_thumbnail',
+            field=models.ImageField(blank=True, editable=False, upload_to='recipes/renditions/', verbose_name='Миниатюра картинки'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+from string import ascii_letters, digits
+
+from django.db import migrations
+
+ALPHABET = digits + ascii_letters
+OFFSET = len(ALPHABET) ** 3
+BATCH_SIZE = 1000
+
+
+def encode_short_link(pk):
+    number = pk + OFFSET
+    code = ''
+    while number:
+        number, remainder = divmod(number, len(ALPHABET))
+        code = ALPHABET[remainder] + code
+    return code
+
+
+def fill_short_links(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    recipes = []
+    for recipe in Recipe.objects.filter(
+        short_link__isnull=True
+    ).only('pk').iterator():
+        recipe.short_link = encode_short_link(recipe.pk)
+        recipes.append(recipe)
+        if len(recipes) == BATCH_SIZE:
+            Recipe.objects.bulk_update(recipes, ('short_link',))
+            recipes = []
+    Recipe.objects.bulk_update(recipes, ('short_link',))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_recipe_image_renditions'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_short_links, migrations.RunPython.noop),
+    ]
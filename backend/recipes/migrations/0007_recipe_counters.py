@@ -0,0 +1,45 @@
+# Generated by Django 3.2.3 on 2026-10-18 04:41
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+COUNTERS = (
+    ('recipes.Recipe', 'favorites_count', 'recipes.Favorite', 'recipe'),
+    ('recipes.Recipe', 'in_carts_count', 'recipes.ShoppingList', 'recipe'),
+    ('user.User', 'recipes_count', 'recipes.Recipe', 'author'),
+    ('user.User', 'followers_count', 'user.Follow', 'author'),
+)
+
+
+def fill_counters(apps, schema_editor):
+    for model, field, related_model, related_field in COUNTERS:
+        related = apps.get_model(related_model).objects.filter(
+            **{related_field: OuterRef('pk')}
+        ).order_by().values(related_field).annotate(
+            total=Count('pk')
+        ).values('total')
+        apps.get_model(model).objects.update(
+            **{field: Coalesce(Subquery(related), 0)})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_recipe_short_link_backfill'),
+        ('user', '0003_user_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В избранном'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='in_carts_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В списках покупок'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
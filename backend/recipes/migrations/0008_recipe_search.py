@@ -0,0 +1,87 @@
+from django.db import migrations
+
+POSTGRESQL_FORWARD = (
+    'ALTER TABLE recipes_recipe ADD COLUMN search_vector tsvector',
+    '''
+    UPDATE recipes_recipe SET search_vector =
+        setweight(to_tsvector('russian', name), 'A')
+        || setweight(to_tsvector('russian', coalesce((
+            SELECT string_agg(ingredient.name, ' ')
+            FROM recipes_ingredientsrecipe AS item
+            JOIN recipes_ingredient AS ingredient
+                ON ingredient.id = item.ingredient_id
+            WHERE item.recipe_id = recipes_recipe.id
+        ), '')), 'B')
+        || setweight(to_tsvector('russian', text), 'C')
+    ''',
+    'CREATE INDEX recipe_search_vector_idx ON recipes_recipe '
+    'USING GIN (search_vector)',
+)
+POSTGRESQL_BACKWARD = (
+    'DROP INDEX IF EXISTS recipe_search_vector_idx',
+    'ALTER TABLE recipes_recipe DROP COLUMN IF EXISTS search_vector',
+)
+SQLITE_FORWARD = (
+    '''
+    CREATE VIRTUAL TABLE recipe_search USING fts5(
+        name, ingredients, text,
+        tokenize = 'unicode61 remove_diacritics 2'
+    )
+    ''',
+    '''
+    INSERT INTO recipe_search (rowid, name, ingredients, text)
+    SELECT recipe.id, recipe.name, coalesce((
+        SELECT group_concat(ingredient.name, ' ')
+        FROM recipes_ingredientsrecipe AS item
+        JOIN recipes_ingredient AS ingredient
+            ON ingredient.id = item.ingredient_id
+        WHERE item.recipe_id = recipe.id
+    ), ''), recipe.text
+    FROM recipes_recipe AS recipe
+    ''',
+)
+SQLITE_BACKWARD = (
+    'DROP TABLE IF EXISTS recipe_search',
+)
+
+
+def has_fts5(schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+        return bool(cursor.fetchone()[0])
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        for statement in statements:
+            schema_editor.execute(statement)
+    return operation
+
+
+def create_search(apps, schema_editor):
+    # Колонка и таблица FTS5 не описаны в модели: Django их не видит,
+    # а заполняет api.search.
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        run(POSTGRESQL_FORWARD)(apps, schema_editor)
+    elif vendor == 'sqlite' and has_fts5(schema_editor):
+        run(SQLITE_FORWARD)(apps, schema_editor)
+
+
+def drop_search(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        run(POSTGRESQL_BACKWARD)(apps, schema_editor)
+    elif vendor == 'sqlite':
+        run(SQLITE_BACKWARD)(apps, schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_recipe_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search, drop_search),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 3.2.3 on 2026-10-18 04:47
+
+import sys
+from array import array
+from collections import Counter
+from itertools import groupby
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def pack(values, typecode):
+    values = array(typecode, values)
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values.tobytes()
+
+
+def fill_index(apps, schema_editor):
+    IngredientsRecipe = apps.get_model('recipes', 'IngredientsRecipe')
+    IngredientRecipeIndex = apps.get_model('recipes', 'IngredientRecipeIndex')
+    pairs = list(IngredientsRecipe.objects.order_by(
+        'ingredient_id', 'recipe_id'
+    ).values_list('ingredient_id', 'recipe_id'))
+    sizes = Counter(recipe_id for _, recipe_id in pairs)
+    rows = []
+    for ingredient_id, group in groupby(pairs, key=lambda pair: pair[0]):
+        recipe_ids = [recipe_id for _, recipe_id in group]
+        rows.append(IngredientRecipeIndex(
+            ingredient_id=ingredient_id,
+            recipe_ids=pack(recipe_ids, 'I'),
+            recipe_sizes=pack(
+                (sizes[recipe_id] for recipe_id in recipe_ids), 'H'),
+        ))
+    IngredientRecipeIndex.objects.bulk_create(rows, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_recipe_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IngredientRecipeIndex',
+            fields=[
+                ('ingredient', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='recipe_index', serialize=False, to='recipes.ingredient', verbose_name='Ингредиент')),
+                ('recipe_ids', models.BinaryField(default=bytes, verbose_name='Рецепты')),
+                ('recipe_sizes', models.BinaryField(default=bytes, verbose_name='Число ингредиентов рецептов')),
+            ],
+            options={
+                'verbose_name': 'Индекс рецептов по ингредиенту',
+                'verbose_name_plural': 'Индекс рецептов по ингредиентам',
+            },
+        ),
+        migrations.RunPython(fill_index, migrations.RunPython.noop),
+    ]
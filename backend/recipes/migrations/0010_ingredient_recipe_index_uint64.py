@@ -0,0 +1,45 @@
+import sys
+from array import array
+
+from django.db import migrations
+
+
+def unpack(data, typecode):
+    values = array(typecode)
+    values.frombytes(bytes(data))
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values
+
+
+def pack(values, typecode):
+    values = array(typecode, values)
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values.tobytes()
+
+
+def repack_recipe_ids(old_typecode, new_typecode):
+    """id рецептов в индексе переводятся из old_typecode в new_typecode."""
+    def repack(apps, schema_editor):
+        IngredientRecipeIndex = apps.get_model(
+            'recipes', 'IngredientRecipeIndex')
+        rows = list(IngredientRecipeIndex.objects.all())
+        for row in rows:
+            row.recipe_ids = pack(
+                unpack(row.recipe_ids, old_typecode), new_typecode)
+        IngredientRecipeIndex.objects.bulk_update(
+            rows, ('recipe_ids',), batch_size=500)
+    return repack
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_ingredient_recipe_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            repack_recipe_ids('I', 'Q'), repack_recipe_ids('Q', 'I')),
+    ]
@@ -3,6 +3,7 @@ from django.db import models
 
 from api.constant import (MAX_LEN_CHARFIELD, MAX_LEN_MINI, MAX_LEN_SLUGFIELD,
                           MIN_SCORE, UNIT_MEASUREMENT)
+from api.counters import CountersMixin
 from user.models import User
 
 
@@ -55,9 +56,11 @@ class Ingredient(models.Model):
         return self.name
 
 
-class Recipe(models.Model):
+class Recipe(CountersMixin, models.Model):
     """Модель Рецептов."""
 
+    counter_fields = ('favorites_count', 'in_carts_count')
+
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -74,6 +77,18 @@ class Recipe(models.Model):
         upload_to='recipes/images/',
         verbose_name='Картинка',
     )
+    image_thumbnail = models.ImageField(
+        upload_to='recipes/renditions/',
+        blank=True,
+        editable=False,
+        verbose_name='Миниатюра картинки',
+    )
+    image_large = models.ImageField(
+        upload_to='recipes/renditions/',
+        blank=True,
+        editable=False,
+        verbose_name='Большая картинка',
+    )
     text = models.TextField(
         verbose_name='Описание'
     )
@@ -109,11 +124,31 @@ class Recipe(models.Model):
         null=True,
         verbose_name='Короткая ссылка',
     )
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='В избранном',
+    )
+    in_carts_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='В списках покупок',
+    )
 
     class Meta:
         ordering = ('-pub_date',)
         verbose_name = "Рецепт"
         verbose_name_plural = "Рецепты"
+        indexes = [
+            models.Index(
+                fields=('-pub_date',),
+                name='recipe_pub_date_idx'
+            ),
+            models.Index(
+                fields=('author', '-pub_date'),
+                name='recipe_author_pub_date_idx'
+            ),
+        ]
 
     def __str__(self):
         return f'Рецепт:{self.name} Автора:{self.author}'
@@ -174,6 +209,12 @@ class TagsRecipe(models.Model):
     class Meta:
         verbose_name = "Тег"
         verbose_name_plural = "Теги"
+        indexes = [
+            models.Index(
+                fields=('name', 'recipe'),
+                name='tags_recipe_name_recipe_idx'
+            ),
+        ]
 
     def __str__(self):
         return f'{self.name} в рецепте: {self.recipe}'
@@ -237,3 +278,78 @@ class ShoppingList(models.Model):
 
     def __str__(self):
         return f'У пользователя {self.author} в списке покупок: {self.recipe}'
+
+
+class ShoppingCartIngredient(models.Model):
+    """Суммарное количество ингредиента в списке покупок пользователя.
+
+    Денормализованная таблица: при добавлении и удалении строк
+    ShoppingList её правят сигналы, в том числе при каскадном удалении
+    рецепта или пользователя; при изменении ингредиентов — API и
+    админка рецептов. Прямые правки IngredientsRecipe (отдельный раздел
+    админки, shell) не учитываются: после них нужна команда
+    rebuild_shopping_cart. Строки с нулевым итогом не удаляются.
+    """
+
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name='Пользователь',
+        related_name='shopping_cart_ingredients'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        verbose_name='Ингредиент',
+    )
+    total_amount = models.PositiveIntegerField(
+        verbose_name='Количество',
+    )
+
+    class Meta:
+        verbose_name = "Ингредиент списка покупок"
+        verbose_name_plural = "Ингредиенты списка покупок"
+        constraints = [
+            models.UniqueConstraint(
+                fields=('author', 'ingredient'),
+                name='unique_shopping_cart_ingredient'
+            )
+        ]
+
+    def __str__(self):
+        return (
+            f'У пользователя {self.author} в списке покупок: '
+            f'{self.ingredient} {self.total_amount}'
+        )
+
+
+class IngredientRecipeIndex(models.Model):
+    """Обратный индекс: рецепты, в которых есть ингредиент.
+
+    Денормализованная таблица: id рецептов хранятся упакованным
+    отсортированным массивом, рядом — число ингредиентов каждого
+    рецепта. Поддерживается при записи рецептов.
+    """
+
+    ingredient = models.OneToOneField(
+        Ingredient,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        verbose_name='Ингредиент',
+        related_name='recipe_index',
+    )
+    recipe_ids = models.BinaryField(
+        default=bytes,
+        verbose_name='Рецепты',
+    )
+    recipe_sizes = models.BinaryField(
+        default=bytes,
+        verbose_name='Число ингредиентов рецептов',
+    )
+
+    class Meta:
+        verbose_name = "Индекс рецептов по ингредиенту"
+        verbose_name_plural = "Индекс рецептов по ингредиентам"
+
+    def __str__(self):
+        return f'Рецепты с ингредиентом {self.ingredient}'
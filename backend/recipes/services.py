@@ -0,0 +1,246 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce, Greatest
+
+from api.cache import COUNTERS, bump_generation
+from recipes.models import (Favorite, IngredientsRecipe, Recipe,
+                            ShoppingCartIngredient, ShoppingList, TagsRecipe)
+from user.models import Follow, User
+
+# (модель, поле счётчика, модель связей, поле связи с объектом).
+COUNTER_FIELDS = (
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+    (Recipe, 'in_carts_count', ShoppingList, 'recipe'),
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'followers_count', Follow, 'author'),
+)
+
+
+def get_recipe_amounts(recipe):
+    """Количество каждого ингредиента рецепта: {id ингредиента: amount}."""
+    return dict(
+        IngredientsRecipe.objects.filter(
+            recipe=recipe
+        ).values_list('ingredient_id', 'amount')
+    )
+
+
+@transaction.atomic
+def update_recipe_ingredients(recipe, new_amounts):
+    """Приводит ингредиенты рецепта к new_amounts {id: amount}.
+
+    Меняются только строки, которые отличаются: новые добавляются,
+    лишние удаляются, у остальных обновляется количество.
+    Возвращает прежние количества.
+    """
+    rows = {
+        row.ingredient_id: row
+        for row in IngredientsRecipe.objects.select_for_update().filter(
+            recipe=recipe)
+    }
+    old_amounts = {
+        ingredient_id: row.amount for ingredient_id, row in rows.items()
+    }
+    IngredientsRecipe.objects.filter(pk__in=[
+        row.pk for ingredient_id, row in rows.items()
+        if ingredient_id not in new_amounts
+    ]).delete()
+    new_rows, changed_rows = [], []
+    for ingredient_id, amount in new_amounts.items():
+        row = rows.get(ingredient_id)
+        if row is None:
+            new_rows.append(IngredientsRecipe(
+                recipe=recipe, ingredient_id=ingredient_id, amount=amount))
+        elif row.amount != amount:
+            row.amount = amount
+            changed_rows.append(row)
+    IngredientsRecipe.objects.bulk_create(new_rows)
+    IngredientsRecipe.objects.bulk_update(changed_rows, ('amount',))
+    return old_amounts
+
+
+@transaction.atomic
+def update_recipe_tags(recipe, tag_ids):
+    """Приводит теги рецепта к tag_ids, не трогая оставшиеся."""
+    rows = dict(
+        TagsRecipe.objects.select_for_update().filter(
+            recipe=recipe).values_list('name_id', 'pk')
+    )
+    TagsRecipe.objects.filter(pk__in=[
+        pk for tag_id, pk in rows.items() if tag_id not in tag_ids
+    ]).delete()
+    TagsRecipe.objects.bulk_create(
+        TagsRecipe(recipe=recipe, name_id=tag_id)
+        for tag_id in tag_ids if tag_id not in rows
+    )
+
+
+def get_cart_author_ids(recipe):
+    """Id пользователей, у которых рецепт в списке покупок."""
+    return list(
+        ShoppingList.objects.filter(
+            recipe=recipe
+        ).values_list('author_id', flat=True)
+    )
+
+
+def get_amounts_delta(old_amounts, new_amounts):
+    """Разница количеств ингредиентов между двумя версиями рецепта."""
+    delta = {
+        ingredient_id: amount - old_amounts.get(ingredient_id, 0)
+        for ingredient_id, amount in new_amounts.items()
+    }
+    for ingredient_id, amount in old_amounts.items():
+        if ingredient_id not in new_amounts:
+            delta[ingredient_id] = -amount
+    return delta
+
+
+@transaction.atomic
+def update_shopping_cart_totals(author_ids, delta):
+    """Прибавляет delta к итогам списков покупок пользователей.
+
+    delta — словарь {id ингредиента: изменение количества}. Недостающие
+    строки вставляются с нулём (конфликты пропускаются, так что
+    параллельные добавления не падают на уникальности), затем итоги
+    меняются атомарным UPDATE через F(). Строки с нулевым итогом
+    остаются и не попадают в список покупок.
+    """
+    delta = {
+        ingredient_id: amount
+        for ingredient_id, amount in delta.items() if amount
+    }
+    author_ids = set(author_ids)
+    if not author_ids or not delta:
+        return
+    ShoppingCartIngredient.objects.bulk_create(
+        (
+            ShoppingCartIngredient(
+                author_id=author_id,
+                ingredient_id=ingredient_id,
+                total_amount=0,
+            )
+            for author_id in author_ids
+            for ingredient_id, amount in delta.items() if amount > 0
+        ),
+        ignore_conflicts=True,
+    )
+    ingredients_by_amount = defaultdict(list)
+    for ingredient_id, amount in delta.items():
+        ingredients_by_amount[amount].append(ingredient_id)
+    for amount, ingredient_ids in ingredients_by_amount.items():
+        ShoppingCartIngredient.objects.filter(
+            author_id__in=author_ids, ingredient_id__in=ingredient_ids
+        ).update(total_amount=Greatest(F('total_amount') + amount, 0))
+
+
+def add_to_shopping_cart_totals(author_id, recipe_id):
+    update_shopping_cart_totals([author_id], get_recipe_amounts(recipe_id))
+
+
+def remove_from_shopping_cart_totals(author_id, recipe_id):
+    update_shopping_cart_totals(
+        [author_id],
+        get_amounts_delta(get_recipe_amounts(recipe_id), {}),
+    )
+
+
+def get_expected_totals():
+    """Итоги списков покупок, посчитанные заново по ShoppingList."""
+    ingredients = IngredientsRecipe.objects.filter(
+        recipe__shopping_lists__isnull=False
+    )
+    return {
+        (author_id, ingredient_id): total_amount
+        for author_id, ingredient_id, total_amount in ingredients.values_list(
+            'recipe__shopping_lists__author_id', 'ingredient_id'
+        ).annotate(total_amount=Sum('amount')).order_by()
+    }
+
+
+@transaction.atomic
+def rebuild_shopping_cart_totals():
+    """Пересобирает таблицу итогов списков покупок с нуля."""
+    ShoppingCartIngredient.objects.all().delete()
+    ShoppingCartIngredient.objects.bulk_create(
+        (
+            ShoppingCartIngredient(
+                author_id=author_id,
+                ingredient_id=ingredient_id,
+                total_amount=total_amount,
+            )
+            for (author_id, ingredient_id), total_amount
+            in get_expected_totals().items()
+        ),
+        batch_size=1000,
+    )
+
+
+def check_shopping_cart_totals():
+    """Расхождения между таблицей итогов и списками покупок.
+
+    Возвращает список (id пользователя, id ингредиента,
+    ожидаемое количество, сохранённое количество).
+    """
+    expected = get_expected_totals()
+    stored = {
+        (author_id, ingredient_id): total_amount
+        for author_id, ingredient_id, total_amount
+        in ShoppingCartIngredient.objects.values_list(
+            'author_id', 'ingredient_id', 'total_amount')
+    }
+    return [
+        (*key, expected.get(key, 0), stored.get(key, 0))
+        for key in sorted(expected.keys() | stored.keys())
+        if expected.get(key, 0) != stored.get(key, 0)
+    ]
+
+
+def change_counter(model, pk, field, delta):
+    """Атомарно прибавляет delta к счётчику объекта.
+
+    После фиксации сбрасывает поколение COUNTERS: от него зависят
+    закэшированные списки, отсортированные по счётчикам.
+    """
+    if delta:
+        model.objects.filter(pk=pk).update(**{field: F(field) + delta})
+        transaction.on_commit(lambda: bump_generation(COUNTERS))
+
+
+def get_counter_expression(related_model, related_field):
+    """Число связанных строк для каждого объекта, подзапросом."""
+    return Coalesce(
+        Subquery(
+            related_model.objects.filter(
+                **{related_field: OuterRef('pk')}
+            ).order_by().values(related_field).annotate(
+                total=Count('pk')
+            ).values('total')
+        ),
+        0,
+    )
+
+
+@transaction.atomic
+def reconcile_counters():
+    """Пересчитывает все счётчики по связанным таблицам."""
+    for model, field, related_model, related_field in COUNTER_FIELDS:
+        model.objects.update(
+            **{field: get_counter_expression(related_model, related_field)})
+    transaction.on_commit(lambda: bump_generation(COUNTERS))
+
+
+def check_counters():
+    """Расхождения счётчиков: (модель, id, поле, ожидается, сохранено)."""
+    mismatches = []
+    for model, field, related_model, related_field in COUNTER_FIELDS:
+        rows = model.objects.annotate(
+            expected=get_counter_expression(related_model, related_field)
+        ).exclude(expected=F(field)).values_list('pk', 'expected', field)
+        mismatches += [
+            (model._meta.verbose_name, pk, field, expected, stored)
+            for pk, expected, stored in rows
+        ]
+    return mismatches
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.3 on 2026-10-18 04:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='avatar_thumbnail',
+            field=models.ImageField(blank=True, editable=False, upload_to='users/renditions/', verbose_name='Миниатюра аватара'),
+        ),
+    ]
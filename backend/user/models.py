@@ -3,14 +3,16 @@ from django.db import models
 
 from api.constant import (MAX_LEN_EMAIL, MAX_LEN_USERNAME_PASSWORD,
                           WRONGUSERNAME)
+from api.counters import CountersMixin
 from user.validators import user_name_validator
 
 
-class User(AbstractUser):
+class User(CountersMixin, AbstractUser):
     """Кастомная модель пользователя.Регистрация с помощью email."""
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ('username', 'first_name', 'last_name', 'password')
+    counter_fields = ('recipes_count', 'followers_count')
 
     username = models.CharField(
         "Имя пользователя",
@@ -36,10 +38,26 @@ class User(AbstractUser):
         null=True,
         default=None
     )
+    avatar_thumbnail = models.ImageField(
+        upload_to='users/renditions/',
+        blank=True,
+        editable=False,
+        verbose_name='Миниатюра аватара',
+    )
     password = models.CharField(
         max_length=MAX_LEN_USERNAME_PASSWORD,
         verbose_name='Пароль'
     )
+    recipes_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Рецептов',
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Подписчиков',
+    )
 
     class Meta:
         verbose_name = "Пользователь"